@@ -1,8 +1,19 @@
+import sys
+from array import array
+from time import perf_counter
+import instrumentation
 from lists import LinkedList
 from graph_representation import AdjacencySet
+from vertex_interning import DenseMap
+
+def record_traversal(stats, name : str, G, level : array, seconds : float):
+    'Record a traversal on the int ids of G into the stats, from the levels of the visited vertices'
+    visited = [u for u in range(len(G)) if level[u] >= 0]
+    stats.traversal(name, (level[u] for u in visited), sum(G.degree(u) for u in visited), seconds)
 
 def BFS_list(s, Adj) -> (dict, dict):
     'Implementation using As seen at MIT 6.006 course'
+    stats, start = instrumentation.active(), perf_counter()
     level = {s : 0}
     parent = {s : None}
     i = 1
@@ -18,64 +29,449 @@ def BFS_list(s, Adj) -> (dict, dict):
         frontier = next
         i += 1
 
+    if stats is not None:
+        stats.traversal('BFS_list', level.values(), sum(len(Adj.neighbors(u)) for u in level), perf_counter() - start)
+
     return parent, level
 
-def BFS(s, Adj) -> (dict, dict):
-    'The "propper" queue version of the BFS'
-    level = {s : 0}
-    parent = {s : None}
+def BFS(s, Adj) -> (DenseMap, DenseMap):
+    '''The "propper" queue version of the BFS
+
+    Runs on the int ids of the graph's CSR snapshot,
+    and returns the parents and the levels as dict-like views of dense arrays.
+    '''
+    stats, start = instrumentation.active(), perf_counter()
+    G = Adj.csr()
+    if s not in G.index:
+        return {s : None}, {s : 0}
+
+    n = len(G)
+    level = array('i', [-1]) * n
+    parent = array('i', [DenseMap.MISSING]) * n
+
+    i = G.index[s]
+    level[i] = 0
+    parent[i] = DenseMap.NONE
     frontier = LinkedList()
-    frontier.add_tail(s) # enqueue
+    frontier.add_tail(i) # enqueue
     while len(frontier) > 0:
         u = frontier.pop_head() # dequeue
-        for v in Adj.neighbors(u):
-            if v not in level:
+        for v in G.neighbor_ids(u):
+            if level[v] < 0:
                 level[v] = level[u] + 1
                 parent[v] = u
                 frontier.add_tail(v)
 
-    return parent, level
+    if stats is not None:
+        record_traversal(stats, 'BFS', G, level, perf_counter() - start)
+
+    return DenseMap(G.interner, parent, DenseMap.MISSING, labelled=True), DenseMap(G.interner, level, -1)
+
+def BFS_array(s, Adj) -> (DenseMap, DenseMap):
+    ''' BFS with all of its state in typed arrays preallocated per call, i.e. no allocation per visited vertex.
+
+    Each vertex is enqueued at most once, so the queue is a single array of n ids with head and tail indices,
+    instead of a LinkedList Node per enqueue. The visited flags are kept in a bytearray.
+    Returns the same dict-like views as BFS().
+    '''
+    stats, start = instrumentation.active(), perf_counter()
+    G = Adj.csr()
+    if s not in G.index:
+        return {s : None}, {s : 0}
+
+    n = len(G)
+    neighbor_ids = G.neighbor_ids
+    visited = bytearray(n)
+    level = array('i', [-1]) * n
+    parent = array('i', [DenseMap.MISSING]) * n
+    queue = array('i', [0]) * n
+
+    i = G.index[s]
+    visited[i] = 1
+    level[i] = 0
+    parent[i] = DenseMap.NONE
+    queue[0] = i
+    head, tail = 0, 1
+    while head < tail:
+        u = queue[head] # dequeue
+        head += 1
+        next_level = level[u] + 1
+        for v in neighbor_ids(u):
+            if not visited[v]:
+                visited[v] = 1
+                level[v] = next_level
+                parent[v] = u
+                queue[tail] = v # enqueue
+                tail += 1
+
+    if stats is not None:
+    # the queue holds the visited vertices
+        stats.traversal('BFS_array', (level[u] for u in queue[:tail]),
+                        sum(G.degree(u) for u in queue[:tail]), perf_counter() - start)
+
+    return DenseMap(G.interner, parent, DenseMap.MISSING, labelled=True), DenseMap(G.interner, level, -1)
+
+def multi_source_bfs(sources, Adj) -> (DenseMap, DenseMap):
+    ''' A single BFS from all the sources at once, i.e. from a virtual vertex connected to each of them.
+
+    Returns
+    -------
+    (level : DenseMap, seed : DenseMap)
+        level[v] is the distance from v's nearest source, and seed[v] is that source.
+        Ties go to the source that comes first in sources. The sources not in the graph are ignored.
+    '''
+    G = Adj.csr()
+    n = len(G)
+    neighbor_ids = G.neighbor_ids
+    level = array('i', [-1]) * n
+    seed = array('i', [DenseMap.MISSING]) * n
+    queue = array('i', [0]) * n
+
+    tail = 0
+    for s in sources:
+        i = G.index.get(s)
+        if i is not None and level[i] < 0:
+            level[i] = 0
+            seed[i] = i
+            queue[tail] = i
+            tail += 1
+
+    head = 0
+    while head < tail:
+        u = queue[head]
+        head += 1
+        next_level = level[u] + 1
+        for v in neighbor_ids(u):
+            if level[v] < 0:
+                level[v] = next_level
+                seed[v] = seed[u]   # v is attributed to the seed that reached it first
+                queue[tail] = v
+                tail += 1
+
+    return DenseMap(G.interner, level, -1), DenseMap(G.interner, seed, DenseMap.MISSING, labelled=True)
+
+def multi_source_bfs_batched(sources, Adj) -> list:
+    ''' Independent BFS traversals from each of the sources, sharing the scans of the graph, as per MS-BFS.
+
+    Up to 64 traversals run at once, each one owning a bit of the 64 bit words
+    seen[v] (the traversals that reached v) and visit[v] (the traversals that have v in their frontier),
+    so a single scan of v's edges advances all the traversals that have v in their frontier.
+    More sources are run in batches of 64.
+
+    Returns
+    -------
+    list of DenseMap
+        The levels of each traversal, in the order of sources.
+    '''
+    G = Adj.csr()
+    sources = list(sources)
+    n = len(G)
+    neighbor_ids = G.neighbor_ids
+    levels = []
+
+    # allocated once, only the entries of the frontiers are set, and they are cleared after each level,
+    # so both are all zeros again at the end of each batch
+    visit = array('Q', [0]) * n
+    visit_next = array('Q', [0]) * n
+
+    for batch_start in range(0, len(sources), 64):
+        batch = sources[batch_start : batch_start + 64]
+        level = [array('i', [-1]) * n for _ in batch]
+        seen = array('Q', [0]) * n
+        frontier = []
+        for b, s in enumerate(batch):
+            i = G.index.get(s)
+            if i is None:
+                continue
+            level[b][i] = 0
+            if visit[i] == 0:
+                frontier.append(i)
+            seen[i] |= 1 << b
+            visit[i] |= 1 << b
+
+        lvl = 0
+        while len(frontier) > 0:
+            lvl += 1
+            next = []
+            for u in frontier:
+                bits = visit[u]
+                for v in neighbor_ids(u):
+                    new = bits & ~seen[v]
+                    if new:
+                        if visit_next[v] == 0:
+                            next.append(v)
+                        visit_next[v] |= new
+                        seen[v] |= new
+                        while new:
+                        # record the level for each traversal that reached v just now
+                            lowest = new & -new
+                            level[lowest.bit_length() - 1][v] = lvl
+                            new ^= lowest
+            for u in frontier:
+                visit[u] = 0
+            visit, visit_next = visit_next, visit
+            frontier = next
+
+        levels += [DenseMap(G.interner, values, -1) for values in level]
+
+    return levels
+
+def BFS_events(s, Adj, max_depth : int = None, visitor = None):
+    ''' Lazy BFS, yields the vertices as they are discovered, instead of returning the complete parent and level.
+
+    The traversal advances only as far as the caller consumes the generator,
+    so breaking out of the loop (or closing the generator) terminates it early.
+    It walks Adj.neighbors() lazily rather than the CSR snapshot, so no O(V) snapshot or array is built up front,
+    and the memory is proportional to the vertices discovered so far.
+
+    Parameters
+    ----------
+    s : any
+        The starting vertex.
+    Adj : AdjacencySet / CSRGraph
+        The graph.
+    max_depth : int
+        The vertices at this depth are yielded, but not expanded. None for no limit.
+    visitor : callable
+        Called as visitor(vertex, parent, depth) for each discovered vertex before it is yielded.
+        If it returns True, the traversal stops after yielding that vertex.
+
+    Yields
+    ------
+    (vertex, parent, depth)
+        In the BFS order, the parent of s is None.
+    '''
+    if s not in Adj.vertices():
+        return
+    visited = {s}
+
+    stop = visitor is not None and visitor(s, None, 0)
+    yield s, None, 0
+    if stop:
+        return
+
+    frontier = [s]
+    depth = 0
+    while len(frontier) > 0 and (max_depth is None or depth < max_depth):
+        depth += 1
+        next = []
+        for u in frontier:
+            for v in Adj.neighbors(u):
+                if v not in visited:
+                    visited.add(v)
+                    next.append(v)
+                    stop = visitor is not None and visitor(v, u, depth)
+                    yield v, u, depth
+                    if stop:
+                        return
+        frontier = next
+
+def bfs_path(s, t, Adj) -> (list, int, int):
+    ''' Bidirectional BFS for the shortest (fewest edges) path from s to t.
+
+    Grows the frontiers from both s (forward, along the outgoing edges) and t (backward, along the incoming edges),
+    a level at a time, always expanding the smaller frontier, and stops as soon as they meet.
+    Until then the two visited sets are disjoint, so the first meeting already gives a shortest path.
+
+    Returns
+    -------
+    (path : list, hops : int, expanded : int)
+        The path from s to t (None if t isn't reachable), the number of its edges (float('Inf') if not reachable),
+        and the number of vertices whose edges were scanned by both searches together.
+    '''
+    G = Adj.csr()
+    if s == t:
+        return [s], 0, 0
+    if s not in G.index or t not in G.index:
+        return None, float('Inf'), 0
+
+    n = len(G)
+    forward = array('i', [DenseMap.MISSING]) * n    # forward[v] is v's parent on the path from s
+    backward = array('i', [DenseMap.MISSING]) * n   # backward[v] is v's successor on the path to t
+    i, j = G.index[s], G.index[t]
+    forward[i] = DenseMap.NONE
+    backward[j] = DenseMap.NONE
+    frontier_f, frontier_b = [i], [j]
+    expanded = 0
+
+    meet = None
+    while meet is None and len(frontier_f) > 0 and len(frontier_b) > 0:
+        if len(frontier_f) <= len(frontier_b):
+            frontier, neighbor_ids, visited, other = frontier_f, G.neighbor_ids, forward, backward
+        else:
+            frontier, neighbor_ids, visited, other = frontier_b, G.neighbor_ids_incoming, backward, forward
+
+        next = []
+        for u in frontier:
+            expanded += 1
+            for v in neighbor_ids(u):
+                if visited[v] == DenseMap.MISSING:
+                    visited[v] = u
+                    if other[v] != DenseMap.MISSING:
+                        meet = v
+                        break
+                    next.append(v)
+            if meet is not None:
+                break
+
+        if frontier is frontier_f:
+            frontier_f = next
+        else:
+            frontier_b = next
+
+    if meet is None:
+        return None, float('Inf'), expanded
+
+    path = []
+    u = meet
+    while u != DenseMap.NONE:
+        path.append(G.labels[u])
+        u = forward[u]
+    path.reverse()
+    u = backward[meet]
+    while u != DenseMap.NONE:
+        path.append(G.labels[u])
+        u = backward[u]
+
+    return path, len(path) - 1, expanded
+
+def BFS_direction_optimizing(s, Adj, alpha : float = 14, beta : float = 24) -> (DenseMap, DenseMap, list):
+    ''' Level-synchronous BFS that switches between top-down and bottom-up steps, as per Beamer et al.
+
+    A top-down step expands the frontier, i.e. scans the outgoing edges of every frontier vertex.
+    A bottom-up step has every unvisited vertex scan its incoming edges until it finds a parent in the frontier,
+    which is cheaper when the frontier holds a large part of the graph, as on low-diameter graphs.
+    The BFS switches to bottom-up when the edges of the frontier exceed 1/alpha of the edges of the unvisited vertices,
+    and back to top-down when the frontier shrinks below 1/beta of the vertices.
+
+    Returns
+    -------
+    (parent : DenseMap, level : DenseMap, scanned : list)
+        The levels are identical to BFS_list's, a parent may be any vertex of the previous level.
+        scanned[i] is the pair (direction, edges) for the step that expanded level i,
+        where the direction is 'top-down' or 'bottom-up' and edges is the number of edges scanned.
+    '''
+    stats, start = instrumentation.active(), perf_counter()
+    G = Adj.csr()
+    if s not in G.index:
+        return {s : None}, {s : 0}, []
+
+    n = len(G)
+    offsets, in_offsets = G.offsets, G.in_offsets
+    level = array('i', [-1]) * n
+    parent = array('i', [DenseMap.MISSING]) * n
+    scanned = []
+
+    i = G.index[s]
+    level[i] = 0
+    parent[i] = DenseMap.NONE
+    frontier = [i]
+    unvisited_edges = G.E - (in_offsets[i + 1] - in_offsets[i])  # the incoming edges of the unvisited vertices
+    bottom_up = False
+    lvl = 0
+    while len(frontier) > 0:
+        frontier_edges = sum(offsets[u + 1] - offsets[u] for u in frontier)
+        if not bottom_up and frontier_edges > unvisited_edges / alpha:
+            bottom_up = True
+        elif bottom_up and len(frontier) < n / beta:
+            bottom_up = False
+
+        next = []
+        edges = 0
+        if bottom_up:
+            in_frontier = bytearray(n)
+            for u in frontier:
+                in_frontier[u] = 1
+            for v in range(n):
+                if level[v] >= 0:
+                    continue
+                for u in G.neighbor_ids_incoming(v):
+                    edges += 1
+                    if in_frontier[u]:
+                    # any parent will do, so the rest of the incoming edges are skipped
+                        level[v] = lvl + 1
+                        parent[v] = u
+                        next.append(v)
+                        break
+        else:
+            edges = frontier_edges
+            for u in frontier:
+                for v in G.neighbor_ids(u):
+                    if level[v] < 0:
+                        level[v] = lvl + 1
+                        parent[v] = u
+                        next.append(v)
+
+        scanned.append(('bottom-up' if bottom_up else 'top-down', edges))
+        unvisited_edges -= sum(in_offsets[v + 1] - in_offsets[v] for v in next)
+        frontier = next
+        lvl += 1
+
+    if stats is not None:
+        stats.traversal('BFS_direction_optimizing', (l for l in level if l >= 0),
+                        sum(edges for _, edges in scanned), perf_counter() - start)
+        stats.count('BFS_direction_optimizing.bottom_up_steps', sum(1 for step, _ in scanned if step == 'bottom-up'))
+
+    return (DenseMap(G.interner, parent, DenseMap.MISSING, labelled=True), DenseMap(G.interner, level, -1),
+            scanned)
 
 
 # Testing --------------------------------------
-c = input("Directed graph? Y/N\n")
-is_directed = (c == "y") or (c == "Y")
-Adj = AdjacencySet(is_directed)
+if __name__ == '__main__':
+    c = input("Directed graph? Y/N\n")
+    is_directed = (c == "y") or (c == "Y")
+    if len(sys.argv) > 1:
+    # the edges are bulk loaded from the edge list file given as the argument
+        Adj = AdjacencySet.from_edgelist(sys.argv[1], is_directed, report=True)
+    else:
+        Adj = AdjacencySet(is_directed)
+
+        n = int(input("The number of edges:\n"))
+        for i in range(n):
+            u, v = (x for x in input("Edge "+str(i+1)+": ").split(' '))
+        
+            Adj.add(u, v)
 
-n = int(input("The number of edges:\n"))
-for i in range(n):
-    u, v = (x for x in input("Edge "+str(i+1)+": ").split(' '))
-    
-    Adj.add(u, v)
+    print(Adj)
 
-print(Adj)
+    s = input("Input the starting vertex for BFS:\n")
+    # with the python list
+    parent1, level1 = BFS_list(s, Adj)
 
-s = input("Input the starting vertex for BFS:\n")
-# with the python list
-parent1, level1 = BFS_list(s, Adj)
+    print("Parents:")
+    for u, p in parent1.items():
+        print(u, p)
 
-print("Parents:")
-for u, p in parent1.items():
-    print(u, p)
+    print("Levels:")
+    for u, lvl in level1.items():
+        print(u, lvl)
 
-print("Levels:")
-for u, lvl in level1.items():
-    print(u, lvl)
+    # with the queue
+    parent2, level2 = BFS(s, Adj)
 
-# with the queue
-parent2, level2 = BFS(s, Adj)
+    # check if the returned dictionaries are the same:
+    for u, lvl in level1.items():
+        assert level2[u] == lvl
 
-# check if the returned dictionaries are the same:
-for u, lvl in level1.items():
-    assert level2[u] == lvl
+    for u, lvl in level2.items():
+        assert level1[u] == lvl
 
-for u, lvl in level2.items():
-    assert level1[u] == lvl
+    # BFS() scans the neighbors in the order of their ids, BFS_list() in the order of the sets,
+    # so their parents may differ, but each has to be a neighbor on the previous level
+    assert set(parent1) == set(parent2)
+    for u, p in parent2.items():
+        if p is None:
+            assert u == s
+        else:
+            assert level1[p] == level1[u] - 1 and u in Adj.neighbors(p)
 
-for u, p in parent1.items():
-    assert parent2[u] == p
+    # with the preallocated arrays
+    parent4, level4 = BFS_array(s, Adj)
+    assert dict(level4) == level1
 
-for u, p in parent2.items():
-    assert parent1[u] == p
+    # switching between top-down and bottom-up
+    parent3, level3, scanned = BFS_direction_optimizing(s, Adj)
+    assert dict(level3) == level1
+    print("Edges scanned per level:", scanned)
 
-print("Exiting...")
\ No newline at end of file
+    print("Exiting...")
\ No newline at end of file
@@ -1,5 +1,12 @@
+import sys
+from array import array
+from time import perf_counter
+import instrumentation
 from lists import LinkedList
+import edge_list
+from graph_csr import CSRGraph
 from graph_representation import AdjacencySet
+from vertex_interning import DenseMap
 
 def DFS_visit(s, Adj, parent, level):
     'DFS recursive function'
@@ -11,24 +18,46 @@ def DFS_visit(s, Adj, parent, level):
 
 def DFS(s, Adj):
     'Depth First Search'
+    stats, start = instrumentation.active(), perf_counter()
     parent = {s : None}
     level = {s : 0}
     DFS_visit(s, Adj, parent, level)
+
+    if stats is not None:
+        stats.traversal('DFS', level.values(), sum(len(Adj.neighbors(u)) for u in level), perf_counter() - start)
     
     return parent, level
 
-def DFS_flood_fill(Adj):
-    'Visit the entire graph via DFS flood-fill'
-    parent = {}
-    level = {}
+def DFS_visit_ids(s : int, G, parent : array, level : array):
+    'DFS recursive function, on the int ids of a CSRGraph'
+    for v in G.neighbor_ids(s):
+        if parent[v] == DenseMap.MISSING:
+            parent[v] = s
+            level[v] = level[s] + 1
+            DFS_visit_ids(v, G, parent, level)
 
-    for s in Adj.vertices():
-        if s not in parent:
-            parent[s] = None
-            level[s] = 0
-            DFS_visit(s, Adj, parent, level)
+def DFS_flood_fill(Adj):
+    '''Visit the entire graph via DFS flood-fill
+
+    Runs on the int ids of the graph's CSR snapshot,
+    and returns the parents and the levels as dict-like views of dense arrays.
+    '''
+    stats, start = instrumentation.active(), perf_counter()
+    G = Adj.csr()
+    n = len(G)
+    parent = array('i', [DenseMap.MISSING]) * n
+    level = array('i', [0]) * n
+
+    for s in range(n):
+        if parent[s] == DenseMap.MISSING:
+            parent[s] = DenseMap.NONE
+            DFS_visit_ids(s, G, parent, level)
+
+    if stats is not None:
+    # every vertex was visited, and scanned its edges
+        stats.traversal('DFS_flood_fill', level, G.E, perf_counter() - start)
     
-    return parent, level
+    return DenseMap(G.interner, parent, labelled=True), DenseMap(G.interner, level)
 
 
 def DFS_iter(s, Adj):
@@ -94,12 +123,232 @@ def DFS_flood_fill_iter(Adj):
     return parent, level
 
 
+DISCOVER = 'discover'
+FINISH = 'finish'
+
+def DFS_events(s, Adj, max_depth : int = None, visitor = None):
+    ''' Lazy iterative DFS, yields the discover and finish events instead of returning the complete parent and level.
+
+    The traversal advances only as far as the caller consumes the generator,
+    so breaking out of the loop (or closing the generator) terminates it early.
+    It walks Adj.neighbors() lazily rather than the CSR snapshot, so no O(V) snapshot or array is built up front,
+    and the memory is proportional to the vertices discovered so far.
+
+    Parameters
+    ----------
+    s : any
+        The starting vertex. If None, the whole graph is flood-filled, akin to DFS_flood_fill_iter().
+    Adj : AdjacencySet / CSRGraph
+        The graph.
+    max_depth : int
+        The vertices at this depth are discovered and finished, but not expanded. None for no limit.
+    visitor : callable
+        Called as visitor(event, vertex, parent, depth) for each event before it is yielded.
+        If it returns True, the traversal stops after yielding that event.
+
+    Yields
+    ------
+    (event, vertex, parent, depth)
+        event is DISCOVER when the vertex is first reached and FINISH when all of its descendants are,
+        the parent of a starting vertex is None.
+    '''
+    visited = set()
+
+    if s is None:
+        roots = Adj.vertices()
+    elif s in Adj.vertices():
+        roots = [s]
+    else:
+        return
+
+    for root in roots:
+        if root in visited:
+            continue
+        visited.add(root)
+        event = (DISCOVER, root, None, 0)
+        stop = visitor is not None and visitor(*event)
+        yield event
+        if stop:
+            return
+
+        # each stack entry is (vertex, its parent, its depth, the iterator over its neighbors left to try)
+        stack = [(root, None, 0, iter(Adj.neighbors(root)) if max_depth is None or max_depth > 0 else iter(()))]
+        while len(stack) > 0:
+            u, p, depth, neighbors = stack[-1]
+
+            # find the next unvisited neighbor
+            found = False
+            for v in neighbors:
+                if v not in visited:
+                    found = True
+                    break
+
+            if found:
+                visited.add(v)
+                expand = max_depth is None or depth + 1 < max_depth
+                stack.append((v, u, depth + 1, iter(Adj.neighbors(v)) if expand else iter(())))
+                event = (DISCOVER, v, u, depth + 1)
+            else:
+            # if the vertex has no neighbors to visit, pop it from the stack
+                stack.pop()
+                event = (FINISH, u, p, depth)
+
+            stop = visitor is not None and visitor(*event)
+            yield event
+            if stop:
+                return
+
+def condensation(G, component : array, c : int) -> CSRGraph:
+    'Return the DAG of the c strongly connected components, with an edge wherever G has one between two components'
+    us, vs = array('i'), array('i')
+    for u in range(len(G)):
+        for v in G.neighbor_ids(u):
+            if component[u] != component[v]:
+                us.append(component[u])
+                vs.append(component[v])
+    us, vs, _ = edge_list.sort_edges(c, us, vs)
+    return CSRGraph(list(range(c)), edge_list.row_offsets(c, us), vs, None, True)
+
+def SCC_tarjan(Adj) -> (DenseMap, CSRGraph):
+    ''' Strongly connected components via Tarjan's algorithm, with an explicit stack instead of recursion.
+
+    Each vertex gets its DFS index and its low-link, the smallest index reachable from its DFS subtree
+    via vertices still on the SCC stack. A vertex whose low-link equals its index is the root of a component,
+    which consists of the vertices above it on the SCC stack.
+
+    Returns
+    -------
+    (component : DenseMap, condensation : CSRGraph)
+        component[u] is the id of u's component. The ids 0..c-1 are in a topological order of the condensation,
+        i.e. the DAG of the components, whose vertices are the component ids.
+    '''
+    G = Adj.csr()
+    n = len(G)
+    offsets, targets = G.offsets, G.targets
+    index = array('i', [-1]) * n
+    low = array('i', [0]) * n
+    on_stack = bytearray(n)
+    component = array('i', [-1]) * n
+    scc_stack = []
+    counter = c = 0
+
+    for root in range(n):
+        if index[root] >= 0:
+            continue
+        index[root] = low[root] = counter
+        counter += 1
+        scc_stack.append(root)
+        on_stack[root] = 1
+        call_stack = [(root, offsets[root])]    # (vertex, the index of its next edge to try)
+
+        while len(call_stack) > 0:
+            u, k = call_stack[-1]
+            stop = offsets[u + 1]
+            descended = False
+            while k < stop:
+                v = targets[k]
+                k += 1
+                if index[v] < 0:
+                # "recurse" into v
+                    call_stack[-1] = (u, k)
+                    index[v] = low[v] = counter
+                    counter += 1
+                    scc_stack.append(v)
+                    on_stack[v] = 1
+                    call_stack.append((v, offsets[v]))
+                    descended = True
+                    break
+                elif on_stack[v] and index[v] < low[u]:
+                    low[u] = index[v]
+            if descended:
+                continue
+
+            # u is finished
+            call_stack.pop()
+            if low[u] == index[u]:
+                while True:
+                    w = scc_stack.pop()
+                    on_stack[w] = 0
+                    component[w] = c
+                    if w == u:
+                        break
+                c += 1
+            if len(call_stack) > 0:
+                p = call_stack[-1][0]
+                if low[u] < low[p]:
+                    low[p] = low[u]
+
+    # Tarjan's finds the components in a reverse topological order
+    component = array('i', (c - 1 - x for x in component))
+    return DenseMap(G.interner, component), condensation(G, component, c)
+
+def SCC_kosaraju(Adj) -> (DenseMap, CSRGraph):
+    ''' Strongly connected components via Kosaraju's algorithm, with explicit stacks instead of recursion.
+
+    The first DFS pass orders the vertices by their finish times.
+    The second pass runs on the transpose of the graph, in the decreasing finish time,
+    and each of its DFS trees is a component.
+
+    Returns the same as SCC_tarjan().
+    '''
+    G = Adj.csr()
+    n = len(G)
+
+    # 1st pass, the finish order
+    offsets, targets = G.offsets, G.targets
+    visited = bytearray(n)
+    order = array('i')
+    for root in range(n):
+        if visited[root]:
+            continue
+        visited[root] = 1
+        stack = [(root, offsets[root])]
+        while len(stack) > 0:
+            u, k = stack[-1]
+            stop = offsets[u + 1]
+            while k < stop and visited[targets[k]]:
+                k += 1
+            if k < stop:
+                v = targets[k]
+                visited[v] = 1
+                stack[-1] = (u, k + 1)
+                stack.append((v, offsets[v]))
+            else:
+                stack.pop()
+                order.append(u)
+
+    # 2nd pass, on the transpose
+    T = G.transpose()
+    component = array('i', [-1]) * n
+    c = 0
+    for root in reversed(order):
+        if component[root] >= 0:
+            continue
+        component[root] = c
+        stack = [root]
+        while len(stack) > 0:
+            u = stack.pop()
+            for v in T.neighbor_ids(u):
+                if component[v] < 0:
+                    component[v] = c
+                    stack.append(v)
+        c += 1
+
+    return DenseMap(G.interner, component), condensation(G, component, c)
+
 def top_sort(Adj):
-    'Top sort via iterative version of DFS'
-    # collecting all starting points:    
+    '''Top sort via iterative version of DFS
+
+    Raises
+    ------
+    AssertionError
+        If the graph is cyclic.
+    '''
+    # collecting all starting points:
+    incoming = Adj.vertices_incoming()  # computed once, it is O(V) per call
     starting_vertices = set()
     for u in Adj.vertices():
-        if u not in Adj.vertices_incoming():
+        if u not in incoming:
         # if u is a vertex without ingoing edges,
             starting_vertices.add(u)
     
@@ -107,6 +356,7 @@ def top_sort(Adj):
         raise AssertionError("Graph is cyclic. Topological sorting isn't possible")
 
     parent = {}
+    on_stack = set()    # a neighbor on the stack closes a cycle
     # level = {}
     stack = LinkedList()
     top_sorted = LinkedList()
@@ -116,18 +366,22 @@ def top_sort(Adj):
         # level[s] = 0
 
         stack.add_head(s)
+        on_stack.add(s)
 
         while len(stack) > 0:
             u = stack.peek_head()
 
             vertex_unfinished = False
             for v in Adj.neighbors(u):
+                if v in on_stack:
+                    raise AssertionError("Graph is cyclic. Topological sorting isn't possible")
                 if v not in parent:
                     vertex_unfinished = True # mark the vertex as unfinished
                     # and add its neighbor to the stack
                     parent[v] = u
                     # level[v] = level[u] + 1
                     stack.add_head(v)
+                    on_stack.add(v)
                     break
             
             if vertex_unfinished:
@@ -135,68 +389,275 @@ def top_sort(Adj):
             else:
             # if the vertex has no neighbors to visit, pop it from the stack
                 u = stack.pop_head()
+                on_stack.remove(u)
                 top_sorted.add_head(u)
 
+    if len(parent) < len(Adj.vertices()):
+    # the unreached vertices all have ingoing edges, so they lie on or after a cycle
+        raise AssertionError("Graph is cyclic. Topological sorting isn't possible")
+
     return top_sorted
 
-# Testing --------------------------------------
-c = input("Directed graph? Y/N\n")
-is_directed = (c == "y") or (c == "Y")
-Adj = AdjacencySet(is_directed)
+def find_cycle(G, remaining) -> list:
+    ''' Return a cycle among the vertices (ids) for which remaining[v] is truthy,
+    given that each of them has an ingoing edge from another one, e.g. the vertices left over by Kahn's algorithm.
+
+    Walks the ingoing edges backwards until a vertex repeats.
+    '''
+    v = next(u for u in range(len(G)) if remaining[u])
+    position = {}
+    walk = []
+    while v not in position:
+        position[v] = len(walk)
+        walk.append(v)
+        v = next(u for u in G.neighbor_ids_incoming(v) if remaining[u])
+    cycle = walk[position[v]:]
+    cycle.reverse()
+    return [G.labels[u] for u in cycle + [cycle[0]]]
+
+def top_sort_kahn(Adj) -> (list, list):
+    ''' Top sort via Kahn's algorithm, in O(V + E).
+
+    Repeatedly removes a vertex with no ingoing edges, decrementing the in-degrees of its neighbors.
+
+    Returns
+    -------
+    (order : list, cycle : list)
+        Either the vertices in a topological order and None,
+        or None and a cycle witness, i.e. the vertices of a cycle [u, ..., u], if the graph is cyclic.
+    '''
+    G = Adj.csr()
+    n = len(G)
+    in_degree = array('i', [0]) * n
+    for v in G.targets:
+        in_degree[v] += 1
+
+    queue = array('i', (u for u in range(n) if in_degree[u] == 0))
+    head = 0
+    while head < len(queue):
+        u = queue[head]
+        head += 1
+        for v in G.neighbor_ids(u):
+            in_degree[v] -= 1
+            if in_degree[v] == 0:
+                queue.append(v)
+
+    if len(queue) < n:
+        return None, find_cycle(G, in_degree)
+    return [G.labels[u] for u in queue], None
+
+def top_sort_dfs(Adj) -> (list, list):
+    ''' Top sort via iterative DFS, in O(V + E): the reversed order of the finish times.
+
+    An edge to a vertex that is still on the DFS stack closes a cycle.
+    Returns the same as top_sort_kahn().
+    '''
+    G = Adj.csr()
+    n = len(G)
+    offsets, targets = G.offsets, G.targets
+    UNVISITED, ON_STACK, FINISHED = 0, 1, 2
+    state = bytearray(n)
+    order = array('i')
+
+    for root in range(n):
+        if state[root] != UNVISITED:
+            continue
+        state[root] = ON_STACK
+        stack = [(root, offsets[root])]
+        while len(stack) > 0:
+            u, k = stack[-1]
+            stop = offsets[u + 1]
+            while k < stop and state[targets[k]] == FINISHED:
+                k += 1
+            if k == stop:
+                stack.pop()
+                state[u] = FINISHED
+                order.append(u)
+                continue
 
-n = int(input("The number of edges:\n"))
-for i in range(n):
-    u, v = (x for x in input("Edge "+str(i+1)+": ").split(' '))
-    
-    Adj.add(u, v)
-
-print(Adj)
-
-# TopSort
-print("TopSort:")
-sorted_vertices = top_sort(Adj)
-print(sorted_vertices)
-
-# # Single source DFS
-# s = input("Input the starting vertex for DFS:\n")
-# print('DFS:')
-# parent, level = DFS(s, Adj)
-# print("parents:")
-# for u, p in parent.items():
-#     print(u, p)
-
-# print("levels:")
-# for u, lvl in level.items():
-#     print(u, lvl)
-
-# print('DFS_iter:')
-# parent, level = DFS_iter(s, Adj)
-# print("parents:")
-# for u, p in parent.items():
-#     print(u, p)
-
-# print("levels:")
-# for u, lvl in level.items():
-#     print(u, lvl)
-
-# print('Flood fill:')
-# parent_fill, level_fill = DFS_flood_fill(Adj)
-# print("parents:")
-# for u, p in parent_fill.items():
-#     print(u, p)
-
-# print("levels:")
-# for u, lvl in level_fill.items():
-#     print(u, lvl)
-
-# print('Flood fill iter:')
-# parent_fill, level_fill = DFS_flood_fill(Adj)
-# print("parents:")
-# for u, p in parent_fill.items():
-#     print(u, p)
-
-# print("levels:")
-# for u, lvl in level_fill.items():
-#     print(u, lvl)
-
-print("Exiting...")
\ No newline at end of file
+            v = targets[k]
+            if state[v] == ON_STACK:
+            # the cycle is the part of the stack from v up
+                cycle = [w for w, _ in stack[next(i for i, (w, _) in enumerate(stack) if w == v):]]
+                return None, [G.labels[w] for w in cycle + [v]]
+            state[v] = ON_STACK
+            stack[-1] = (u, k + 1)
+            stack.append((v, offsets[v]))
+
+    order.reverse()
+    return [G.labels[u] for u in order], None
+
+class IncrementalTopSort:
+    ''' Maintains a topological order of a DAG under edge insertions, via the Pearce-Kelly algorithm.
+
+    An edge u->v that agrees with the order (u before v) changes nothing.
+    Otherwise only the affected region between v and u is searched and reordered:
+    the vertices reachable from v that are before u, and the vertices reaching u that are after v.
+    The edges are added to the given AdjacencySet, which must not be modified other than via add_edge().
+    '''
+
+    def __init__(self, Adj):
+        ''' Parameters
+        ----------
+        Adj : AdjacencySet
+            A directed acyclic graph, keeping the incoming edges.
+
+        Raises
+        ------
+        ValueError
+            If the graph is cyclic.
+        '''
+        self.Adj = Adj
+        order, cycle = top_sort_kahn(Adj)
+        if cycle is not None:
+            raise ValueError('The graph is cyclic: ' + str(cycle))
+        self.position = {u : i for i, u in enumerate(order)}   # vertex -> its index in the order
+        self.vertices = order                                   # index in the order -> vertex
+
+    def add_vertex(self, u):
+        'Append the vertex u to the order, if it isn\'t there yet'
+        if u not in self.position:
+            self.position[u] = len(self.vertices)
+            self.vertices.append(u)
+
+    def add_edge(self, u, v, w = None) -> list:
+        ''' Add the edge u->v to the graph and update the order.
+
+        Returns
+        -------
+        cycle : list
+            None if the edge was added, otherwise the cycle [u, v, ..., u] that it would close,
+            in which case neither the graph nor the order is changed.
+        '''
+        if u == v:
+        # a self-loop is a cycle, rejected before the order is touched
+            return [u, u]
+
+        # a new vertex has no edges yet, so the edge can't close a cycle through it
+        self.add_vertex(u)
+        self.add_vertex(v)
+        position = self.position
+        lower, upper = position[v], position[u]
+
+        if lower < upper:
+        # the affected region: forward from v, within the positions up to u's
+            parent = {v : None}
+            forward = [v]
+            stack = [v]
+            while len(stack) > 0:
+                x = stack.pop()
+                for y in self.Adj.neighbors(x):
+                    if y == u:
+                        cycle = [u]
+                        while x is not None:
+                            cycle.append(x)
+                            x = parent[x]
+                        cycle[1:] = reversed(cycle[1:])
+                        return cycle + [u]
+                    if y not in parent and position[y] < upper:
+                        parent[y] = x
+                        forward.append(y)
+                        stack.append(y)
+
+            # and backward from u, within the positions down to v's
+            seen = {u}
+            backward = [u]
+            stack = [u]
+            while len(stack) > 0:
+                x = stack.pop()
+                for y in self.Adj.neighbors_incoming(x):
+                    if y not in seen and position[y] > lower:
+                        seen.add(y)
+                        backward.append(y)
+                        stack.append(y)
+
+            # the vertices reaching u go before the ones reachable from v, reusing their positions
+            forward.sort(key=position.__getitem__)
+            backward.sort(key=position.__getitem__)
+            region = backward + forward
+            for i, x in zip(sorted(position[x] for x in region), region):
+                position[x] = i
+                self.vertices[i] = x
+
+        self.Adj.add(u, v, w)
+        return None
+
+    def order(self) -> list:
+        'Return the vertices in the topological order'
+        return list(self.vertices)
+
+# Testing --------------------------------------
+if __name__ == '__main__':
+    c = input("Directed graph? Y/N\n")
+    is_directed = (c == "y") or (c == "Y")
+    if len(sys.argv) > 1:
+    # the edges are bulk loaded from the edge list file given as the argument
+        Adj = AdjacencySet.from_edgelist(sys.argv[1], is_directed, report=True)
+    else:
+        Adj = AdjacencySet(is_directed)
+
+        n = int(input("The number of edges:\n"))
+        for i in range(n):
+            u, v = (x for x in input("Edge "+str(i+1)+": ").split(' '))
+        
+            Adj.add(u, v)
+
+    print(Adj)
+
+    # Strongly connected components
+    component, dag = SCC_tarjan(Adj)
+    print("SCCs:", dict(component))
+
+    # TopSort
+    print("TopSort:")
+    order, cycle = top_sort_kahn(Adj)
+    if cycle is not None:
+        print("The graph is cyclic:", cycle)
+    else:
+        print(order)
+        sorted_vertices = top_sort(Adj)
+        print(sorted_vertices)
+
+    # # Single source DFS
+    # s = input("Input the starting vertex for DFS:\n")
+    # print('DFS:')
+    # parent, level = DFS(s, Adj)
+    # print("parents:")
+    # for u, p in parent.items():
+    #     print(u, p)
+
+    # print("levels:")
+    # for u, lvl in level.items():
+    #     print(u, lvl)
+
+    # print('DFS_iter:')
+    # parent, level = DFS_iter(s, Adj)
+    # print("parents:")
+    # for u, p in parent.items():
+    #     print(u, p)
+
+    # print("levels:")
+    # for u, lvl in level.items():
+    #     print(u, lvl)
+
+    # print('Flood fill:')
+    # parent_fill, level_fill = DFS_flood_fill(Adj)
+    # print("parents:")
+    # for u, p in parent_fill.items():
+    #     print(u, p)
+
+    # print("levels:")
+    # for u, lvl in level_fill.items():
+    #     print(u, lvl)
+
+    # print('Flood fill iter:')
+    # parent_fill, level_fill = DFS_flood_fill(Adj)
+    # print("parents:")
+    # for u, p in parent_fill.items():
+    #     print(u, p)
+
+    # print("levels:")
+    # for u, lvl in level_fill.items():
+    #     print(u, lvl)
+
+    print("Exiting...")
\ No newline at end of file
@@ -1,48 +1,98 @@
 ''' Author: Miloš Pivaš, student
 '''
 
+from time import perf_counter
+
+import instrumentation
 from graph_representation import AdjacencySet
+from vertex_interning import DenseMap
 
-def bellman_ford_sssp(Adj, s):
-    'Bellman-Ford algorithm for single-source shortest paths from vertex s'
+def relax_round(N : int, dp : list, offsets, targets, weights) -> bool:
+    'Try to relax every edge out of the reached vertices once, return whether any path got shorter'
 
-    N = len(Adj)
+    inf = float('Inf')
+    updated = False
+    for u in range(N):
+    # for every vertex in the graph
 
-    # 0th step, copy of all weights from s to its neighbors
-    dp = Adj.W[s].copy()
+        if dp[u] == inf:
+        # if u hasn't been reached by the search yet
+            continue
 
-    dp[s] = 0   # this is optional,
-                # maybe we want to find a shortest round-trip path from source
+        for k in range(offsets[u], offsets[u + 1]):
+        # for every v, a neighbor of u
+            # try a path via u to v
+            v = targets[k]
+            if dp[u] + weights[k] < dp[v]:
+                dp[v] = dp[u] + weights[k]
+                updated = True
 
-    for _ in range(1, N-1):
-    # N-1 because that's the length of the longest possible path in graph
+    return updated
+
+
+def relax_round_counted(N : int, dp : list, offsets, targets, weights) -> (int, int):
+    'The same as relax_round(), but return the number of (relaxations, edges scanned), for the instrumentation'
+
+    inf = float('Inf')
+    relaxations, edges_scanned = 0, 0
+    for u in range(N):
+        if dp[u] == inf:
+            continue
+
+        edges_scanned += offsets[u + 1] - offsets[u]
+        for k in range(offsets[u], offsets[u + 1]):
+            v = targets[k]
+            if dp[u] + weights[k] < dp[v]:
+                dp[v] = dp[u] + weights[k]
+                relaxations += 1
 
-        for v in Adj.V:
-        # for every vertex in the graph
+    return relaxations, edges_scanned
 
-            aux = []
-            for u in Adj.neighbors_incoming(v):
-            # for every u, an incoming neighbor of v
 
-                if u in dp:
-                # if u has already been reached by the search
-                    # try a path via u to v
-                    aux += [dp[u] + Adj.W[u][v]]
-            
+def bellman_ford_sssp(Adj, s):
+    '''Bellman-Ford algorithm for single-source shortest paths from vertex s
+
+    Runs on the int ids of the graph's CSR snapshot, keeping dp in a dense list,
+    and returns it as a dict-like view keyed by the vertices.
+    When instrumented, the rounds are run by relax_round_counted() instead, so the plain rounds count nothing.
+    '''
+
+    stats, start = instrumentation.active(), perf_counter()
+    G = Adj.csr()
+    N = len(G)
+    offsets, targets, weights = G.offsets, G.targets, G.weights
+    inf = float('Inf')
+
+    # 0th step, copy of all weights from s to its neighbors
+    dp = [inf] * N   # a list keeps the type of the weights, e.g. int distances for int weights
+    source = G.index[s]
+    for k in range(offsets[source], offsets[source + 1]):
+        dp[targets[k]] = weights[k]
+
+    dp[source] = 0  # this is optional,
+                    # maybe we want to find a shortest round-trip path from source
+
+    rounds = 0
+    for rounds in range(1, N-1):
+    # N-1 because that's the length of the longest possible path in graph
 
-            if aux != []:
-            # if there are paths to v
+        if stats is None:
+            updated = relax_round(N, dp, offsets, targets, weights)
+        else:
+            relaxations, edges_scanned = relax_round_counted(N, dp, offsets, targets, weights)
+            stats.count('bellman_ford.relaxations', relaxations)
+            stats.count('bellman_ford.edges_scanned', edges_scanned)
+            updated = relaxations > 0
 
-                # get the min path
-                m = min(aux)
+        if not updated:
+        # no path got shorter in this round, so none will in the next ones
+            break
 
-                # update
-                dp[v] = min(m, dp[v]) if v in dp else m
+    if stats is not None:
+        stats.count('bellman_ford.rounds', rounds)
+        stats.time('bellman_ford', perf_counter() - start)
 
-    for v in Adj.V:
-        if v not in dp:
-            dp[v] = float('Inf')
-    return dp
+    return DenseMap(G.interner, dp)
 
 
 # # acyclic
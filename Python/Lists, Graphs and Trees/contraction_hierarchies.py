@@ -0,0 +1,463 @@
+"""
+    The module implements contraction hierarchies (CH), for answering many s-t shortest path queries on a static graph.
+
+    Preprocessing contracts the vertices one by one, in the order of their importance:
+    contracting v removes it from the remaining graph, and for each of its in-neighbors u and out-neighbors w
+    inserts the shortcut u -> w of weight w(u, v) + w(v, w), unless a witness search finds a path from u to w
+    that avoids v and is no longer, so the distances between the remaining vertices are preserved.
+    The order is by edge difference, i.e. the number of shortcuts contracting v would add minus the edges it removes,
+    plus the number of v's neighbors contracted already, which spreads the contraction evenly over the graph.
+
+    The vertices are contracted in rounds, each round contracting an independent set of vertices whose priorities
+    are the smallest in their neighborhoods, and the witness searches of a round avoid the whole set.
+    So a round's witness searches only read the remaining graph, and they are run across a process pool.
+
+    The rank of a vertex is its position in the order. A query is a bidirectional Dijkstra that only goes up:
+    forward from s along the edges to higher ranked vertices, backward from t along the edges from higher ranked ones.
+    Every shortest path has a version with shortcuts that goes up and then down, so the two searches meet at its top,
+    and each settles only a small part of the graph. The shortcuts of the path are then unpacked via their middle vertices.
+
+    The index is persisted in a binary format that is reopened via mmap, akin to graph_file's.
+"""
+
+import heapq
+import mmap
+import multiprocessing
+import os
+import struct
+import sys
+from array import array
+from time import perf_counter
+
+import graph_file
+import instrumentation
+
+MAGIC = b'CHIX'
+VERSION = 1
+
+SECTIONS = ('label_data', 'label_offsets', 'label_order', 'rank',
+            'up_offsets', 'up_targets', 'up_weights', 'up_middle',
+            'down_offsets', 'down_sources', 'down_weights', 'down_middle')
+TYPECODES = {'label_offsets' : 'q', 'label_order' : 'i', 'rank' : 'i',
+             'up_offsets' : 'q', 'up_targets' : 'i', 'up_weights' : 'd', 'up_middle' : 'i',
+             'down_offsets' : 'q', 'down_sources' : 'i', 'down_weights' : 'd', 'down_middle' : 'i'}
+# magic, version, flags, n, the number of the up and the down edges, then an (offset, size) pair for each section
+HEADER = struct.Struct('<4sHHQQQ' + 'QQ' * len(SECTIONS))
+
+ORIGINAL = -1   # the middle vertex of the edges that aren't shortcuts
+
+# the per-process state of the preprocessing, set by init_worker()
+state = {}
+
+
+def init_worker(out : list, inn : list, excluded : bytearray, settle_limit : int):
+    'Keep the remaining graph for the witness searches'
+    state['out'] = out
+    state['inn'] = inn
+    state['excluded'] = excluded
+    state['settle_limit'] = settle_limit
+
+
+def witness_search(out : list, source : int, excluded : bytearray, limit : float, settle_limit : int) -> dict:
+    'Return the distances from source in the remaining graph avoiding the excluded vertices, up to limit'
+    inf = float('Inf')
+    d = {source : 0.0}
+    heap = [(0.0, source)]
+    settled = 0
+    while heap:
+        du, u = heapq.heappop(heap)
+        if du > d[u]:
+            continue
+        if du > limit or settled == settle_limit:
+        # the tentative distances are still lengths of real paths, so they remain valid witnesses
+            break
+        settled += 1
+        for w, (weight, _) in out[u].items():
+            if excluded[w]:
+                continue
+            dw = du + weight
+            if dw < d.get(w, inf):
+                d[w] = dw
+                heapq.heappush(heap, (dw, w))
+    return d
+
+
+def shortcuts(v : int, out : list, inn : list, excluded : bytearray, settle_limit : int) -> list:
+    'Return the shortcuts (u, w, weight) that contracting v needs, given that the excluded vertices are contracted too'
+    inf = float('Inf')
+    needed = []
+    if not out[v]:
+        return needed
+    longest = max(weight for weight, _ in out[v].values())
+    for u, (weight_uv, _) in inn[v].items():
+        d = witness_search(out, u, excluded, weight_uv + longest, settle_limit)
+        for w, (weight_vw, _) in out[v].items():
+            if w != u and d.get(w, inf) > weight_uv + weight_vw:
+                needed.append((u, w, weight_uv + weight_vw))
+    return needed
+
+
+def simulate(vs : array) -> list:
+    'Return the number of shortcuts that contracting each of the vertices alone would need'
+    out, inn, excluded, settle_limit = state['out'], state['inn'], state['excluded'], state['settle_limit']
+    counts = []
+    for v in vs:
+        excluded[v] = 1
+        counts.append(len(shortcuts(v, out, inn, excluded, settle_limit)))
+        excluded[v] = 0
+    return counts
+
+
+def contract(vs : array) -> list:
+    'Return the shortcuts that contracting each of the vertices needs, the excluded ones being contracted at once'
+    out, inn, excluded, settle_limit = state['out'], state['inn'], state['excluded'], state['settle_limit']
+    return [shortcuts(v, out, inn, excluded, settle_limit) for v in vs]
+
+
+def run(task, vs : list, P : int, sequential_cutoff : int) -> list:
+    'Run the task on the vertices, across a pool of P processes sharing the state, if there are enough of them'
+    if P == 1 or len(vs) < sequential_cutoff:
+        return task(vs)
+    chunks = [vs[k::P] for k in range(P)]
+    # the pool is forked from the current state of the remaining graph, so it's created per phase
+    with multiprocessing.Pool(P, init_worker, (state['out'], state['inn'], state['excluded'], state['settle_limit'])) as pool:
+        parts = pool.map(task, chunks)
+    results = [None] * len(vs)
+    for k, part in enumerate(parts):
+        results[k::P] = part
+    return results
+
+
+class ContractionHierarchy:
+    ''' Implements the contraction hierarchy of a graph, and the queries on it.
+
+    The hierarchy is kept in two CSR graphs over the vertex ids, both indexed by the lower ranked endpoint:
+        up      - the edges v -> w with rank[w] > rank[v], searched forward from s
+        down    - the edges u -> v with rank[u] > rank[v], searched backward from t
+    The middle of a shortcut is the vertex whose contraction inserted it, ORIGINAL for the edges of the graph.
+    '''
+
+    def __init__(self, labels, index, rank, up_offsets, up_targets, up_weights, up_middle,
+                 down_offsets, down_sources, down_weights, down_middle):
+        self.labels = labels
+        self.index = index
+        self.rank = rank
+        self.up_offsets, self.up_targets, self.up_weights, self.up_middle = up_offsets, up_targets, up_weights, up_middle
+        self.down_offsets, self.down_sources, self.down_weights, self.down_middle = (down_offsets, down_sources,
+                                                                                     down_weights, down_middle)
+
+    @classmethod
+    def build(cls, Adj, processes : int = None, settle_limit : int = 500, sequential_cutoff : int = 1024):
+        ''' Preprocess the graph into its contraction hierarchy.
+
+        Parameters
+        ----------
+        Adj : AdjacencySet / CSRGraph
+            The weighted graph, without negative edges.
+        processes : int
+            The number of processes to run the witness searches across, os.cpu_count() by default.
+        settle_limit : int
+            The witness searches give up after settling this many vertices, and the shortcut is inserted,
+            which keeps the preprocessing fast at the cost of a few unneeded shortcuts.
+        sequential_cutoff : int
+            The phases with fewer vertices than this are run in this process.
+
+        Returns
+        -------
+        ContractionHierarchy
+        '''
+        stats, start = instrumentation.active(), perf_counter()
+        P = processes or os.cpu_count() or 1
+        G = Adj.csr()
+        n = len(G)
+        inf = float('Inf')
+
+        # the remaining graph, out[u][w] = inn[w][u] = (weight, middle), keeping the lightest of the parallel edges
+        out = [{} for _ in range(n)]
+        inn = [{} for _ in range(n)]
+        offsets, targets, weights = G.offsets, G.targets, G.weights
+        for u in range(n):
+            for k in range(offsets[u], offsets[u + 1]):
+                w = targets[k]
+                if w != u and weights[k] < out[u].get(w, (inf,))[0]:
+                    out[u][w] = inn[w][u] = (weights[k], ORIGINAL)
+
+        excluded = bytearray(n)
+        init_worker(out, inn, excluded, settle_limit)
+
+        rank = array('i', [0]) * n
+        up = [None] * n         # up[v] = the edges (w, weight, middle) of v to higher ranked vertices
+        down = [None] * n       # down[v] = the edges (u, weight, middle) to v from higher ranked vertices
+        deleted = array('i', [0]) * n    # the number of contracted neighbors
+        priority = array('d', [0]) * n
+        remaining = set(range(n))
+        stale = list(range(n))
+        next_rank = 0
+        rounds, shortcuts_added = 0, 0
+        try:
+            while remaining:
+                rounds += 1
+                for v, count in zip(stale, run(simulate, stale, P, sequential_cutoff)):
+                    priority[v] = count - len(inn[v]) - len(out[v]) + deleted[v]
+
+                # the vertices whose priorities (ties broken by the ids) are the smallest among their neighbors
+                independent = sorted((v for v in remaining
+                                      if all((priority[v], v) < (priority[x], x) for x in out[v])
+                                      and all((priority[v], v) < (priority[x], x) for x in inn[v])),
+                                     key=lambda v: (priority[v], v))
+                for v in independent:
+                    excluded[v] = 1
+                needed = run(contract, independent, P, sequential_cutoff)
+
+                touched = set()
+                for v, added in zip(independent, needed):
+                    rank[v] = next_rank
+                    next_rank += 1
+                    up[v] = [(w, weight, middle) for w, (weight, middle) in out[v].items()]
+                    down[v] = [(u, weight, middle) for u, (weight, middle) in inn[v].items()]
+                    for w in out[v]:
+                        del inn[w][v]
+                        touched.add(w)
+                    for u in inn[v]:
+                        del out[u][v]
+                        touched.add(u)
+                    out[v], inn[v] = {}, {}
+                    for u, w, weight in added:
+                        if weight < out[u].get(w, (inf,))[0]:
+                            out[u][w] = inn[w][u] = (weight, v)
+                            shortcuts_added += 1
+                    remaining.discard(v)
+                for v in touched:
+                    deleted[v] += 1
+                stale = sorted(touched & remaining)
+        finally:
+            state.clear()
+
+        up_offsets, up_targets, up_weights, up_middle = cls.pack(up)
+        down_offsets, down_sources, down_weights, down_middle = cls.pack(down)
+
+        if stats is not None:
+            stats.count('ch.rounds', rounds)
+            stats.count('ch.shortcuts', shortcuts_added)
+            stats.time('ch.build', perf_counter() - start)
+
+        return cls(list(G.labels), dict(G.index), rank, up_offsets, up_targets, up_weights, up_middle,
+                   down_offsets, down_sources, down_weights, down_middle)
+
+    @staticmethod
+    def pack(edges : list) -> (array, array, array, array):
+        'Return the per-vertex lists of (endpoint, weight, middle) in the CSR format'
+        offsets = array('q', [0])
+        endpoints, weights, middles = array('i'), array('d'), array('i')
+        for row in edges:
+            for endpoint, weight, middle in row:
+                endpoints.append(endpoint)
+                weights.append(weight)
+                middles.append(middle)
+            offsets.append(len(endpoints))
+        return offsets, endpoints, weights, middles
+
+    def search(self, source : int, target : int) -> (float, int, dict, dict, int):
+        ''' The upward bidirectional Dijkstra between the ids source and target.
+
+        Unlike the plain bidirectional Dijkstra, it can't stop when the searches meet,
+        as the top of the shortest path may be beyond the meeting vertex, so each side stops
+        once its smallest key reaches mu.
+
+        Returns
+        -------
+        (mu : float, meet : int, forward : dict, backward : dict, settled : int)
+            The distance, the top vertex of the path (None if unreachable),
+            the predecessor edges v -> (u, k) of both searches, k indexing the up or the down edges,
+            and the number of vertices settled.
+        '''
+        inf = float('Inf')
+        sides = ((self.up_offsets, self.up_targets, self.up_weights, {source : 0.0}, {}, [(0.0, source)]),
+                 (self.down_offsets, self.down_sources, self.down_weights, {target : 0.0}, {}, [(0.0, target)]))
+        mu, meet = inf, None
+        if source == target:
+            mu, meet = 0.0, source
+        settled = 0
+        side = 0
+        while (sides[0][5] and sides[0][5][0][0] < mu) or (sides[1][5] and sides[1][5][0][0] < mu):
+            offsets, neighbors, weights, d, Pi, heap = sides[side]
+            other_d = sides[1 - side][3]
+            side = 1 - side
+            if not heap or heap[0][0] >= mu:
+                continue
+            du, u = heapq.heappop(heap)
+            if du > d[u]:
+                continue
+            settled += 1
+            for k in range(offsets[u], offsets[u + 1]):
+                v = neighbors[k]
+                dv = du + weights[k]
+                if dv < d.get(v, inf):
+                    d[v] = dv
+                    Pi[v] = (u, k)
+                    heapq.heappush(heap, (dv, v))
+                    if v in other_d and dv + other_d[v] < mu:
+                        mu, meet = dv + other_d[v], v
+        return mu, meet, sides[0][4], sides[1][4], settled
+
+    def middle(self, u : int, v : int) -> int:
+        'Return the middle vertex of the edge u -> v of the hierarchy'
+        if self.rank[u] < self.rank[v]:
+            for k in range(self.up_offsets[u], self.up_offsets[u + 1]):
+                if self.up_targets[k] == v:
+                    return self.up_middle[k]
+        else:
+            for k in range(self.down_offsets[v], self.down_offsets[v + 1]):
+                if self.down_sources[k] == u:
+                    return self.down_middle[k]
+        raise KeyError((u, v))
+
+    def unpack(self, u : int, v : int, middle : int) -> list:
+        'Return the vertices of the original edges that the edge u -> v stands for, after u'
+        path = []
+        stack = [(u, v, middle)]
+        while stack:
+            u, v, middle = stack.pop()
+            if middle == ORIGINAL:
+                path.append(v)
+            else:
+            # u -> middle -> v, the second half is pushed first so that the first one is unpacked first
+                stack.append((middle, v, self.middle(middle, v)))
+                stack.append((u, middle, self.middle(u, middle)))
+        return path
+
+    def distance(self, s, t) -> float:
+        'Return the distance from s to t, inf if t isn\'t reachable from s'
+        return self.search(self.index[s], self.index[t])[0]
+
+    def query(self, s, t) -> (list, float):
+        ''' Shortest path from s to t.
+
+        Returns
+        -------
+        (path : list, distance : float)
+            The vertices of a shortest path in the original graph, and its length.
+            (None, inf) if t isn't reachable from s.
+        '''
+        stats, start = instrumentation.active(), perf_counter()
+        source, target = self.index[s], self.index[t]
+        mu, meet, forward, backward, settled = self.search(source, target)
+        if meet is None:
+            return None, mu
+
+        # the up edges from source to meet, then the down edges from meet to target
+        edges = []
+        v = meet
+        while v != source:
+            u, k = forward[v]
+            edges.append((u, v, self.up_middle[k]))
+            v = u
+        edges.reverse()
+        v = meet
+        while v != target:
+            u, k = backward[v]
+            edges.append((v, u, self.down_middle[k]))
+            v = u
+
+        path = [source]
+        for u, v, middle in edges:
+            path.extend(self.unpack(u, v, middle))
+
+        if stats is not None:
+            stats.count('ch.query.vertices_popped', settled)
+            stats.time('ch.query', perf_counter() - start)
+
+        return [self.labels[u] for u in path], mu
+
+    def __len__(self):
+        return len(self.rank)
+
+    def save(self, path):
+        ''' Write the hierarchy to a file, to be reopened via ContractionHierarchy.open().
+
+        Raises
+        ------
+        TypeError
+            If the labels aren't all ints or all strs.
+        '''
+        n = len(self.rank)
+        labels = list(self.labels)
+        flags, label_data, label_offsets = graph_file.encode_labels(labels)
+        if sys.byteorder == 'big':
+            flags |= graph_file.BIG_ENDIAN
+
+        sections = {'label_data' : label_data, 'label_order' : array('i', sorted(range(n), key=labels.__getitem__))}
+        if label_offsets is not None:
+            sections['label_offsets'] = label_offsets
+        for name in SECTIONS[3:]:
+            sections[name] = array(TYPECODES[name], getattr(self, name))
+
+        layout = []
+        position = HEADER.size
+        for name in SECTIONS:
+            if name in sections:
+                size = len(memoryview(sections[name]).cast('B'))
+                layout += [position, size]
+                position += (size + 7) // 8 * 8
+            else:
+                layout += [0, 0]
+
+        with open(path, 'wb') as f:
+            f.write(HEADER.pack(MAGIC, VERSION, flags, n, len(self.up_targets), len(self.down_sources), *layout))
+            for k, name in enumerate(SECTIONS):
+                if name in sections:
+                    f.seek(layout[2 * k])
+                    f.write(sections[name])
+            f.truncate(position)
+
+    @classmethod
+    def open(cls, path):
+        ''' Open a hierarchy file written by save(), backed by mmap, so opening is O(1) and the pages are shared.
+
+        Raises
+        ------
+        ValueError
+            If the file isn't a hierarchy file of this version and byte order.
+        '''
+        with open(path, 'rb') as f:
+            mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        if len(mm) < HEADER.size:
+            raise ValueError('Not a contraction hierarchy file: ' + str(path))
+        magic, version, flags, n, m_up, m_down, *fields = HEADER.unpack_from(mm)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError('Not a contraction hierarchy file of version ' + str(VERSION) + ': ' + str(path))
+        if bool(flags & graph_file.BIG_ENDIAN) != (sys.byteorder == 'big'):
+            raise ValueError('The file was written on a machine of different byte order: ' + str(path))
+
+        buffer = memoryview(mm)
+        typecodes = dict(TYPECODES, label_data='B' if flags & graph_file.STR_LABELS else 'q')
+        views = {}
+        for k, name in enumerate(SECTIONS):
+            position, size = fields[2 * k], fields[2 * k + 1]
+            views[name] = buffer[position : position + size].cast(typecodes[name])
+
+        labels = graph_file.LabelTable(views['label_data'],
+                                       views['label_offsets'] if flags & graph_file.STR_LABELS else None)
+        CH = cls(labels, graph_file.LabelIndex(labels, views['label_order']), *(views[name] for name in SECTIONS[3:]))
+        CH.mmap = mm
+        return CH
+
+
+# from dijkstra import Dijkstra
+# from graph_generators import grid
+
+# if __name__ == '__main__':
+#     Adj = grid(100, 100, drop=0.2, directed=True, weights=(1, 10), seed=1)
+#     start = perf_counter()
+#     CH = ContractionHierarchy.build(Adj)
+#     print('build:', '%.3f' % (perf_counter() - start), 's')
+#     CH.save('grid.chix')
+#     CH = ContractionHierarchy.open('grid.chix')
+
+#     start = perf_counter()
+#     path, distance = CH.query(0, 100 * 100 - 1)
+#     print('query:', '%.6f' % (perf_counter() - start), 's', distance, path)
+#     print(Dijkstra.dijkstra_lazy(Adj, 0)[0][100 * 100 - 1])
+
+# print("Exiting...")
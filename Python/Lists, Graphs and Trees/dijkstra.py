@@ -1,14 +1,51 @@
 
 '''
     A module that implements Dijkstra's algorithm.
-    Depends on: graph_representation.py, fibonacci_heap.py
+    Depends on: graph_representation.py, fibonacci_heap.py, instrumentation.py
 
     Author: Miloš Pivaš, student
 '''
 
 
+import heapq
+import math
+import random
+from array import array
+from time import perf_counter
+
+import instrumentation
 from graph_representation import AdjacencySet
-from fibonacci_heap import FibonacciHeap
+from fibonacci_heap import FibonacciHeap, CountingFibonacciHeap
+from vertex_interning import DenseMap, SparseMap
+
+class LazyHeap:
+    '''Implements a binary min-heap (on heapq) priority queue with lazy deletion
+
+    Has no decrease_key(), instead a vertex is pushed again with its decreased key,
+    so a name may be in the heap more than once, and its stale (larger key) entries
+    are to be skipped by the caller when popped.
+    '''
+
+    def __init__(self):
+        self.heap = []
+
+    def push(self, name, key):
+        'Insert the name with the given key'
+        heapq.heappush(self.heap, (key, name))
+
+    def pop_min(self):
+        '''Remove the minimum-key entry and return its (name, key), or (None, None) if the heap is empty'''
+        if not self.heap:
+            return None, None
+        key, name = heapq.heappop(self.heap)
+        return name, key
+
+    def __len__(self):
+        return len(self.heap)
+
+    def empty(self):
+        'Check if the heap is empty'
+        return not self.heap
 
 class Dijkstra:
     '''Class that implements Dijkstra\'s algorithm
@@ -24,11 +61,12 @@ class Dijkstra:
 
         For Dijkstra we need some ADTs (Abstract Data Structures):
         Adj - an AdjacencySet for graph representation.
-        d   - a hashmap that is going to hold current (and finally shortest) distances from source to each node.
-        S   - a hashset that is going to hold all vertices that we know the shortest paths to.
+        d   - an array that is going to hold current (and finally shortest) distances from source to each node.
+        S   - a bytearray that is going to flag all vertices that we know the shortest paths to.
         Q   - a priority queue (with decrease_key() operation) that is going to hold all unvisited vertices.
             Q's priorities are the d[] values.
-        Pi  - a hashmap that maps vertices to their predecessor nodes in the paths coming from the source.
+        Pi  - an array that maps vertices to their predecessor nodes in the paths coming from the source.
+        The arrays are indexed by the vertices' int ids, given by the graph's interner.
 
     Time Complexity
     ---------------
@@ -90,36 +128,376 @@ class Dijkstra:
 
         Returns
         -------
-        (d : dict, Pi : dict)
+        (d : DenseMap, Pi : DenseMap)
             d maps vertices to shortest path lengths from source.
             Pi maps vertices to their predecessor nodes in the paths coming from the source.
+            Both are dict-like views of dense arrays indexed by the graph's int ids,
+            the vertices are translated from/to the ids only on access.
         '''
 
-        # initialization
-        d = {v:float('Inf') for v in Adj.V}
-        d[s] = 0
+        stats, start = instrumentation.active(), perf_counter()
 
-        Pi = {}
-        Q = FibonacciHeap()
+        # initialization, on the int ids of the graph's CSR snapshot
+        G = Adj.csr()
+        n = len(G)
+        offsets, targets, weights = G.offsets, G.targets, G.weights
+        source = G.index[s]
 
-        S = set()
-        for u in Adj.V:
-            if u == s:
-                Q.push(s, 0)
+        d = [float('Inf')] * n   # a list keeps the type of the weights, e.g. int distances for int weights
+        d[source] = 0
+
+        Pi = array('i', [DenseMap.MISSING]) * n
+        # the counting heap only when instrumented, so the plain run counts nothing
+        Q = FibonacciHeap() if stats is None else CountingFibonacciHeap()
+
+        S = bytearray(n)
+        for u in range(n):
+            if u == source:
+                Q.push(source, 0)
             else:
                 Q.push(u, float('Inf'))
         
-        Q.__str__()
         while not Q.empty():
             u, key = Q.pop_min()
             d[u] = key
-            S.add(u)
-            for v in Adj.neighbors(u):
-                if v not in S:
-                    cls.relax(u, v, Adj, d, Pi)
-                    Q.decrease_key(v, d[v])
+            S[u] = 1
+            for k in range(offsets[u], offsets[u + 1]):
+                v = targets[k]
+                if not S[v]:
+                    # relax, inlined
+                    if d[u] + weights[k] < d[v]:
+                        d[v] = d[u] + weights[k]
+                        Pi[v] = u
+                        Q.decrease_key(v, d[v])
+
+        if stats is not None:
+        # every vertex was popped, and scanned its edges, and every relaxation decreased a key
+            stats.count('dijkstra.vertices_popped', n)
+            stats.count('dijkstra.edges_scanned', G.E)
+            stats.count('dijkstra.relaxations', Q.counts['decrease_key'])
+            for name, k in Q.counts.items():
+                stats.count('heap.' + name, k)
+            stats.time('dijkstra', perf_counter() - start)
+
+        return DenseMap(G.interner, d), DenseMap(G.interner, Pi, DenseMap.MISSING, labelled=True)
+
+    @classmethod
+    def dijkstra_lazy(cls, Adj : AdjacencySet, s, queue = LazyHeap):
+        '''Dijkstra\'s algorithm that only touches the vertices reachable from the source
+
+        Instead of pushing all the vertices at infinity, only the source is pushed,
+        and a vertex is pushed again whenever its distance decreases (lazy deletion),
+        its stale entries are skipped when popped.
+        d and Pi are dicts on the reached ids, so a query that reaches a small part of a large graph
+        costs proportionally to that part, not to V.
+
+        Parameters
+        ----------
+        Adj : AdjacencySet
+            Datastructure for graph representation.
+        s : str/int
+            The source vertex.
+        queue : class
+            The priority queue, its instances have to provide push(name, key), pop_min() and empty(),
+            and accept the same name more than once, as LazyHeap does.
+
+        Returns
+        -------
+        (d : SparseMap, Pi : SparseMap)
+            The same as dijkstra()\'s, d maps the vertices that weren\'t reached to infinity lazily, i.e. on access.
+        '''
+
+        stats, start = instrumentation.active(), perf_counter()
+        G = Adj.csr()
+        offsets, targets, weights = G.offsets, G.targets, G.weights
+        source = G.index[s]
+        inf = float('Inf')
+
+        d = {source : 0}
+        Pi = {}
+        Q = queue()
+        push, pop_min = Q.push, Q.pop_min
+        if stats is not None:
+            push = instrumentation.Counted(push)
+        push(source, 0)
+
+        while not Q.empty():
+            u, du = pop_min()
+            if du > d[u]:
+            # a stale entry, u was already popped with a smaller key
+                continue
+            for k in range(offsets[u], offsets[u + 1]):
+                v = targets[k]
+                dv = du + weights[k]
+                # relax, inlined, a settled v can't be improved on as there are no negative edges
+                if dv < d.get(v, inf):
+                    d[v] = dv
+                    Pi[v] = u
+                    push(v, dv)
+
+        if stats is not None:
+        # every reached vertex was popped once with its final distance, and scanned its edges,
+        # and every relaxation pushed a vertex
+            popped, relaxations = len(d), push.calls - 1
+            stats.count('dijkstra_lazy.vertices_popped', popped)
+            stats.count('dijkstra_lazy.edges_scanned', sum(offsets[u + 1] - offsets[u] for u in d))
+            stats.count('dijkstra_lazy.relaxations', relaxations)
+            stats.count('dijkstra_lazy.stale_pops', relaxations + 1 - popped)
+            stats.time('dijkstra_lazy', perf_counter() - start)
+
+        return SparseMap(G.interner, d, inf), SparseMap(G.interner, Pi, labelled=True)
+
+
+def unwind_path(Pi : dict, source : int, target : int) -> list:
+    'Return the path of ids from source to target, following the predecessors Pi back from the target'
+    path = [target]
+    while path[-1] != source:
+        path.append(Pi[path[-1]])
+    path.reverse()
+    return path
+
+def shortest_path(Adj, s, t, heuristic = None, queue = LazyHeap) -> (list, float, int):
+    ''' Shortest path from s to t, via Dijkstra that stops as soon as t is settled, or via A* given a heuristic.
 
-        return d, Pi
+    A* pops the vertices by d[v] + heuristic(v), i.e. by the estimated length of the whole path via v,
+    which steers the search towards t. The heuristic has to be admissible, i.e. never overestimate
+    the distance from v to t (see euclidean_heuristic() and Landmarks). If it's also consistent,
+    no vertex is popped twice, otherwise the improved vertices are simply pushed again.
+    A heuristic may return infinity for a vertex that can't reach t, which prunes it.
+
+    Parameters
+    ----------
+    Adj : AdjacencySet / CSRGraph
+        The graph, without negative edges.
+    s, t : any
+        The source and the target vertex.
+    heuristic : callable
+        heuristic(v) is a lower bound on the distance from the vertex v to t, None for plain Dijkstra.
+    queue : class
+        The priority queue, as for Dijkstra.dijkstra_lazy().
+
+    Returns
+    -------
+    (path : list, distance : float, settled : int)
+        The vertices of a shortest path from s to t, its length and the number of vertices settled.
+        (None, inf, settled) if t isn't reachable from s.
+    '''
+    stats, start = instrumentation.active(), perf_counter()
+    inf = float('Inf')
+    if s == t:
+        return [s], 0, 0
+    G = Adj.csr()
+    if s not in G.index or t not in G.index:
+        return None, inf, 0
+
+    offsets, targets, weights, labels = G.offsets, G.targets, G.weights, G.labels
+    source, target = G.index[s], G.index[t]
+
+    d = {source : 0}
+    Pi = {}
+    h = {}  # the heuristic's values, computed once per vertex
+    if heuristic is not None:
+        h[source] = heuristic(s)
+    Q = queue()
+    push, pop_min = Q.push, Q.pop_min
+    push(source, h.get(source, 0.0))
+
+    settled, edges_scanned = 0, 0
+    found = False
+    while not Q.empty():
+        u, key = pop_min()
+        du = d[u]
+        if key > du + h.get(u, 0.0):
+        # a stale entry, u was already popped with a smaller key
+            continue
+        settled += 1
+        if u == target:
+            found = True
+            break
+        edges_scanned += offsets[u + 1] - offsets[u]
+        for k in range(offsets[u], offsets[u + 1]):
+            v = targets[k]
+            dv = du + weights[k]
+            if dv < d.get(v, inf):
+                hv = 0.0
+                if heuristic is not None:
+                    hv = h.get(v)
+                    if hv is None:
+                        hv = h[v] = heuristic(labels[v])
+                    if hv == inf:
+                        continue
+                d[v] = dv
+                Pi[v] = u
+                push(v, dv + hv)
+
+    if stats is not None:
+        name = 'shortest_path' if heuristic is None else 'a_star'
+        stats.count(name + '.vertices_popped', settled)
+        stats.count(name + '.edges_scanned', edges_scanned)
+        stats.time(name, perf_counter() - start)
+
+    if not found:
+        return None, inf, settled
+    return [labels[u] for u in unwind_path(Pi, source, target)], d[target], settled
+
+def bidirectional_dijkstra(Adj, s, t, queue = LazyHeap) -> (list, float, int):
+    ''' Shortest path from s to t, via a forward Dijkstra from s alternating with a backward one from t.
+
+    The backward search runs on the incoming edges, i.e. on the graph's reverse index.
+    Whenever one search labels a vertex the other one has labelled too, the path joined there is a candidate,
+    mu being the length of the shortest candidate so far. As both searches pop their vertices in the order
+    of distance, no path shorter than mu is left once the keys popped last from the two sides add up to mu,
+    so each search explores a ball of about half the s-t distance, instead of one of the whole distance.
+
+    Parameters
+    ----------
+    Adj : AdjacencySet / CSRGraph
+        The graph, without negative edges.
+    s, t : any
+        The source and the target vertex.
+    queue : class
+        The priority queue, as for Dijkstra.dijkstra_lazy().
+
+    Returns
+    -------
+    (path : list, distance : float, settled : int)
+        The same as shortest_path()\'s, settled counts the vertices settled by both searches.
+    '''
+    stats, start = instrumentation.active(), perf_counter()
+    inf = float('Inf')
+    if s == t:
+        return [s], 0, 0
+    G = Adj.csr()
+    if s not in G.index or t not in G.index:
+        return None, inf, 0
+
+    source, target = G.index[s], G.index[t]
+    # the forward and the backward sides, each with (offsets, neighbors, weights, d, Pi, Q)
+    sides = ((G.offsets, G.targets, G.weights, {source : 0}, {}, queue()),
+             (G.in_offsets, G.in_sources, G.in_weights, {target : 0}, {}, queue()))
+    sides[0][5].push(source, 0)
+    sides[1][5].push(target, 0)
+
+    mu, meet = inf, None
+    last = [0.0, 0.0]   # the keys popped last by each side
+    settled, edges_scanned = 0, 0
+    side = 0
+    while True:
+        offsets, neighbors, weights, d, Pi, Q = sides[side]
+        other_d = sides[1 - side][3]
+        if Q.empty():
+        # all the vertices reachable by this side are labelled, and so is the other end, so mu is final
+            break
+        u, du = Q.pop_min()
+        if du > d[u]:
+        # a stale entry
+            continue
+        if du + last[1 - side] >= mu:
+            break
+        last[side] = du
+        settled += 1
+        edges_scanned += offsets[u + 1] - offsets[u]
+        for k in range(offsets[u], offsets[u + 1]):
+            v = neighbors[k]
+            dv = du + weights[k]
+            if dv < d.get(v, inf):
+                d[v] = dv
+                Pi[v] = u
+                Q.push(v, dv)
+                if v in other_d and dv + other_d[v] < mu:
+                    mu, meet = dv + other_d[v], v
+        side = 1 - side
+
+    if stats is not None:
+        stats.count('bidirectional_dijkstra.vertices_popped', settled)
+        stats.count('bidirectional_dijkstra.edges_scanned', edges_scanned)
+        stats.time('bidirectional_dijkstra', perf_counter() - start)
+
+    if meet is None:
+        return None, inf, settled
+    # s -> meet by the forward predecessors, then meet -> t by the backward ones, i.e. the successors towards t
+    path = unwind_path(sides[0][4], source, meet) + unwind_path(sides[1][4], target, meet)[-2::-1]
+    return [G.labels[u] for u in path], mu, settled
+
+def euclidean_heuristic(coords : dict, t, scale : float = 1.0):
+    ''' Return the A* heuristic of the straight-line distances to t, i.e. scale * |coords[v] - coords[t]|.
+
+    It's admissible (and consistent) if no edge weighs less than scale times the straight-line distance
+    between its endpoints, e.g. for road lengths with scale = 1, or for travel times with scale = 1 / the max speed.
+    '''
+    target = coords[t]
+    dist = math.dist
+    return lambda v: scale * dist(coords[v], target)
+
+class Landmarks:
+    ''' Implements the ALT (A*, landmarks and triangle inequality) heuristics.
+
+    The distances from and to a few landmarks L are precomputed once per graph.
+    By the triangle inequality, for any vertex v and target t:
+        d(v, t) >= d(L, t) - d(L, v)    and    d(v, t) >= d(v, L) - d(t, L)
+    so the largest of these bounds over the landmarks is an admissible and consistent heuristic.
+    The landmarks are picked greedily to be far from each other, i.e. "behind" many of the s-t pairs,
+    where the bounds are tight.
+
+    Parameters
+    ----------
+    Adj : AdjacencySet / CSRGraph
+        The graph, without negative edges.
+    k : int
+        The number of landmarks.
+    seed : any
+        The seed of the random first landmark.
+    '''
+
+    def __init__(self, Adj, k : int = 8, seed = None):
+        G = Adj.csr()
+        T = Adj.transpose()
+        n = len(G)
+        inf = float('Inf')
+        self.G = G
+        self.landmarks = []
+        self.forward = []   # forward[j][v] = d(landmarks[j], v)
+        self.backward = []  # backward[j][v] = d(v, landmarks[j])
+
+        nearest = array('d', [inf]) * n     # the distance from the nearest landmark
+        L = random.Random(seed).randrange(n) if n > 0 else None
+        while L is not None and len(self.landmarks) < k:
+            self.landmarks.append(L)
+            fw, bw = array('d', [inf]) * n, array('d', [inf]) * n
+            for dist, D in ((fw, Dijkstra.dijkstra_lazy(G, G.labels[L])[0]), (bw, Dijkstra.dijkstra_lazy(T, G.labels[L])[0])):
+                for v, x in D.data.items():
+                    dist[v] = x
+            self.forward.append(fw)
+            self.backward.append(bw)
+
+            for v in range(n):
+                if fw[v] < nearest[v]:
+                    nearest[v] = fw[v]
+            # the farthest vertex from the landmarks, the unreached ones first
+            L = max(range(n), key=nearest.__getitem__)
+            if nearest[L] == 0:
+                L = None
+
+    def heuristic(self, t):
+        'Return the A* heuristic of the lower bounds on the distances to t'
+        index = self.G.index
+        i = index[t]
+        bounds = [(fw, fw[i], bw, bw[i]) for fw, bw in zip(self.forward, self.backward)]
+
+        def h(v):
+            j = index[v]
+            best = 0.0
+            for fw, fw_t, bw, bw_t in bounds:
+                # inf - inf is nan, i.e. no bound, and fails the comparisons
+                x = fw_t - fw[j]
+                if x > best:
+                    best = x
+                x = bw[j] - bw_t
+                if x > best:
+                    best = x
+            return best
+
+        return h
 
 
 # ### testing
@@ -145,4 +523,30 @@ class Dijkstra:
 # print(d)
 # print(Pi)
 
+# d, Pi = Dijkstra.dijkstra_lazy(Adj, 'A')
+
+# print(d)
+# print(Pi)
+
+# print(shortest_path(Adj, 'A', 'D'))
+# print(shortest_path(Adj, 'A', 'D', Landmarks(Adj, 2).heuristic('D')))
+# print(bidirectional_dijkstra(Adj, 'A', 'D'))
+
+# # benchmark, on a grid and on a road-like one, i.e. with 20% of its streets dropped
+# import random
+# from time import perf_counter
+# from graph_generators import grid
+
+# for drop in (0.0, 0.2):
+#     Adj = grid(150, 150, drop=drop, directed=True, weights=(1, 10), seed=1)
+#     rng = random.Random(1)
+#     pairs = [(rng.randrange(150 * 150), rng.randrange(150 * 150)) for _ in range(10)]
+#     for name, query in (('dijkstra', lambda s, t: Dijkstra.dijkstra(Adj, s)),
+#                         ('shortest_path', lambda s, t: shortest_path(Adj, s, t)),
+#                         ('bidirectional_dijkstra', lambda s, t: bidirectional_dijkstra(Adj, s, t))):
+#         start = perf_counter()
+#         for s, t in pairs:
+#             query(s, t)
+#         print('drop', drop, name, '%.4f' % ((perf_counter() - start) / len(pairs)), 's per query')
+
 # print('Exiting...')
\ No newline at end of file
@@ -0,0 +1,271 @@
+"""
+    The module implements bulk loading of edge lists.
+
+    An edge list is a text file (optionally gzip-ed) or an iterable with one edge per line:
+        u v         - for unweighted graphs
+        u v w       - for weighted graphs
+    The fields can be separated by whitespace or commas.
+    Empty lines and lines starting with '#' or '%' are skipped.
+
+    Instead of calling add() once per edge, the file is read in large chunks,
+    and each chunk is split into lines and fields, and transposed into columns, all at C speed.
+    The labels are interned to dense ids and the edges are de-duplicated and sorted by (u, v),
+    so the graph classes can build their structures from the columns in a single pass.
+"""
+
+import gzip
+from array import array
+from bisect import bisect_left
+from itertools import repeat
+from operator import add, mul, floordiv, mod
+from time import perf_counter
+
+CHUNK_SIZE = 1 << 22    # characters read from the file at once
+COMMENTS = ('#', '%')
+
+
+def open_edgelist(path):
+    'Open an edge list file for reading text, transparently decompressing gzip'
+    with open(path, 'rb') as f:
+        magic = f.read(2)
+
+    if magic == b'\x1f\x8b':
+        return gzip.open(path, 'rt')
+    return open(path, 'r')
+
+
+def parse_line(line : str, k : int, line_number : int) -> list:
+    'Split a single line into its k fields, returns None for empty and comment lines'
+    parts = line.replace(',', ' ').split()
+    if len(parts) == 0 or parts[0].startswith(COMMENTS):
+        return None
+    if len(parts) < k:
+        raise ValueError('Line ' + str(line_number) + ' has fewer than ' + str(k) + ' fields: ' + repr(line))
+    return parts[:k]
+
+
+def chunk_columns(lines : list, k : int, first_line : int) -> (list, list, list):
+    'Parse a chunk of lines line by line, returns the u, v and w columns'
+    us, vs, ws = [], [], []
+    for line_number, line in enumerate(lines, first_line):
+        parts = parse_line(line, k, line_number)
+        if parts is not None:
+            us.append(parts[0])
+            vs.append(parts[1])
+            if k == 3:
+                ws.append(parts[2])
+    return us, vs, ws
+
+
+def read_chunks(source, weighted : bool = False):
+    ''' Read an edge list in chunks.
+
+    Parameters
+    ----------
+    source : str / path / iterable
+        A path to an edge list file, or an iterable of lines or (u, v) / (u, v, w) tuples.
+    weighted : bool
+        Whether the third field holds the weight of the edge.
+
+    Yields
+    ------
+    (us : list, vs : list, ws : list, lines : int)
+        The columns of the chunk, and the number of lines it was read from.
+        The fields are unconverted, i.e. strings if they were read from text.
+    '''
+
+    k = 3 if weighted else 2
+
+    if isinstance(source, (str, bytes)) or hasattr(source, '__fspath__'):
+        with open_edgelist(source) as f:
+            line_number = 1
+            while True:
+                text = f.read(CHUNK_SIZE)
+                if text == '':
+                    break
+                # complete the last line of the chunk
+                if not text.endswith('\n'):
+                    text += f.readline()
+                lines = text.count('\n') + (0 if text.endswith('\n') else 1)
+
+                rows = None
+                if not any(c in text for c in COMMENTS):
+                # the fast path: split the whole chunk at once
+                    rows = list(map(str.split, text.replace(',', ' ').splitlines()))
+                    if set(map(len, rows)) != {k}:
+                    # there are empty lines, or lines with missing or extra fields
+                        rows = None
+
+                if rows is not None:
+                    columns = list(zip(*rows))
+                    yield list(columns[0]), list(columns[1]), list(columns[2]) if weighted else [], lines
+                else:
+                # the slow path: parse the lines one by one, reporting malformed lines
+                    us, vs, ws = chunk_columns(text.splitlines(), k, line_number)
+                    yield us, vs, ws, lines
+
+                line_number += lines
+    else:
+        us, vs, ws = [], [], []
+        lines = 0
+        for item in source:
+            lines += 1
+            if isinstance(item, str):
+                parts = parse_line(item, k, lines)
+                if parts is None:
+                    continue
+            else:
+                parts = item
+            us.append(parts[0])
+            vs.append(parts[1])
+            if weighted:
+                ws.append(parts[2])
+
+            if len(us) >= CHUNK_SIZE // 16:
+                yield us, vs, ws, lines
+                us, vs, ws = [], [], []
+                lines = 0
+        yield us, vs, ws, lines
+
+
+def weight_array(values):
+    'Pack the weights into a typed array that keeps their type: q for ints, d for reals, or a list for anything else'
+    values = list(values)
+    if all(type(w) is int for w in values):
+        return array('q', values)
+    if all(type(w) in (int, float) for w in values):
+        return array('d', values)
+    return values
+
+
+def pack(n : int, us, vs) -> list:
+    'Pack the edge columns into the int keys u*n + v'
+    return list(map(add, map(mul, us, repeat(n)), vs))
+
+
+def unpack(n : int, keys : list) -> (array, array):
+    'Unpack the int keys u*n + v into the edge columns'
+    return array('i', map(floordiv, keys, repeat(n))), array('i', map(mod, keys, repeat(n)))
+
+
+def transpose(n : int, us : array, vs : array) -> (array, array):
+    'Return the reversed edge columns (vs, us), sorted by (v, u)'
+    return unpack(n, sorted(pack(n, vs, us)))
+
+
+def load_edgelist(source, directed : bool = True, weighted : bool = False,
+                  label_type = None, weight_type = float) -> dict:
+    ''' Load an edge list into sorted, de-duplicated, interned columns.
+
+    Parameters
+    ----------
+    source : str / path / iterable
+        A path to an edge list file (plain or gzip), or an iterable of lines or tuples.
+    directed : bool
+        If False, each edge u-v is stored as both u->v and v->u.
+    weighted : bool
+        Whether the edges carry weights.
+    label_type : callable
+        Applied to the labels read from the text, e.g. int. None keeps them as they are.
+    weight_type : callable
+        Applied to the weights read from the text.
+
+    Returns
+    -------
+    dict with the keys:
+        labels  - list, maps ids to labels, in the order of first appearance
+        us, vs  - array('i'), the ids of the edges' endpoints, sorted by (u, v) with no duplicates
+        ws      - the weights (see weight_array()), or None if unweighted. For duplicated edges the last weight wins.
+        stats   - dict with the number of lines, edges, the time taken and the throughput
+    '''
+
+    start = perf_counter()
+
+    index = {}  # label -> id
+    n_lines = 0
+    us, vs = array('i'), array('i')
+    ws = [] if weighted else None
+
+    for u_col, v_col, w_col, lines in read_chunks(source, weighted):
+        n_lines += lines
+        if label_type is not None:
+            u_col = list(map(label_type, u_col))
+            v_col = list(map(label_type, v_col))
+
+        # intern the labels that weren't seen before, dict.fromkeys() de-duplicates them at C speed
+        seen = dict.fromkeys(u_col)
+        seen.update(dict.fromkeys(v_col))
+        new = [label for label in seen if label not in index]
+        index.update(zip(new, range(len(index), len(index) + len(new))))
+
+        us.extend(map(index.__getitem__, u_col))
+        vs.extend(map(index.__getitem__, v_col))
+        if weighted:
+            ws.extend(map(weight_type, w_col))
+
+    n_read = len(us)
+    n = len(index)
+    us, vs, ws = sort_edges(n, us, vs, ws, directed)
+
+    stats = make_stats(start, n_lines, n_read, n, len(us))
+    return {'labels' : list(index), 'us' : us, 'vs' : vs, 'ws' : ws, 'stats' : stats}
+
+
+def sort_edges(n : int, us, vs, ws = None, directed : bool = True) -> (array, array, array):
+    ''' Sort the edge columns of ids by (u, v) and de-duplicate them.
+
+    If not directed, each edge u-v is stored as both u->v and v->u.
+    For duplicated edges the last weight wins. ws is None for unweighted graphs.
+    '''
+
+    # pack each edge into a single int key u*n + v, so one sort orders the edges by (u, v)
+    keys = pack(n, us, vs)
+    if not directed:
+        # both directions of an edge are kept next to each other, so the last weight still wins
+        keys = [key for pair in zip(keys, pack(n, vs, us)) for key in pair]
+        if ws is not None:
+            ws = [w for w in ws for _ in range(2)]
+
+    if ws is not None:
+        # later occurrences overwrite earlier ones, akin to AdjacencySet.add()
+        last = dict(zip(keys, ws))
+        keys = sorted(last)
+        ws = weight_array(map(last.__getitem__, keys))
+    else:
+        keys = sorted(set(keys))
+
+    us, vs = unpack(n, keys)
+    return us, vs, ws
+
+
+def make_stats(start : float, lines : int, edges_read : int, vertices : int, edges : int) -> dict:
+    'Collect the statistics of a load that started at perf_counter() == start'
+    seconds = perf_counter() - start
+    return {
+        'lines' : lines,
+        'edges_read' : edges_read,
+        'edges' : edges,
+        'vertices' : vertices,
+        'seconds' : seconds,
+        'lines_per_second' : lines / seconds if seconds > 0 else float('Inf'),
+    }
+
+
+def report(stats : dict):
+    'Print the throughput of a load'
+    print('Loaded ' + str(stats['lines']) + ' lines, '
+          + str(stats['vertices']) + ' vertices, ' + str(stats['edges']) + ' edges in '
+          + '%.3f' % stats['seconds'] + ' s (' + '%.0f' % stats['lines_per_second'] + ' lines/s)')
+
+
+def row_offsets(n : int, us : array) -> array:
+    'Return the CSR row offsets of the sorted column us, via binary search for each row start'
+    return array('q', map(bisect_left, repeat(us), range(n + 1)))
+
+
+def row_ids(offsets : array) -> array:
+    'The inverse of row_offsets(), expand the offsets back into the sorted column us'
+    us = array('i')
+    for i in range(len(offsets) - 1):
+        us.extend(repeat(i, offsets[i + 1] - offsets[i]))
+    return us
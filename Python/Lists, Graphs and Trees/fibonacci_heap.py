@@ -63,7 +63,7 @@ class FibonacciHeap:
 
         self.root_list[node.degree].add(node)
     
-        if node.key < self.min:
+        if self.min_node is None or node.key < self.min:
             self.min = node.key
             self.min_node = node
         
@@ -122,6 +122,10 @@ class FibonacciHeap:
         while len(degrees) > 0:
             d = degrees.pop()
 
+            if d not in self.root_list:
+            # the degree was pushed more than once, and all of its trees were already merged
+                continue
+
             while len(self.root_list[d]) >= 2:
             # until there less than 2 trees of the degree d remain
 
@@ -129,8 +133,8 @@ class FibonacciHeap:
                 larger = self.root_list[d].pop()
                 smaller = self.root_list[d].pop()
 
-                # identify the smaller
-                if larger.key < smaller.key:
+                # identify the smaller (on equal keys the min node has to stay a root)
+                if larger.key < smaller.key or larger is self.min_node:
                     aux = larger
                     larger = smaller
                     smaller = aux
@@ -187,7 +191,7 @@ class FibonacciHeap:
         self.min = float('Inf')
         for node_list in self.root_list.values():
             for node in node_list:
-                if node.key < self.min:
+                if self.min_node is None or node.key < self.min:
                     self.min = node.key
                     self.min_node = node
 
@@ -236,6 +240,11 @@ class FibonacciHeap:
             raise Exception('New key does not decrease the old key')
         curr.key = new_key
 
+        # a root may become the new min
+        if curr.parent is None and curr.key < self.min:
+            self.min = curr.key
+            self.min_node = curr
+
         # check if it maintains the heap property
         if curr.parent is None or curr.parent.key <= curr.key:
             return
@@ -318,6 +327,47 @@ class FibonacciHeap:
         return s
 
 
+class CountingFibonacciHeap(FibonacciHeap):
+    '''Implements Fibonacci Heap that counts its operations, for the instrumentation
+
+    The counts are kept in the counts dict: push, pop_min, decrease_key,
+    links (trees merged by merge()) and cuts (nodes promoted by decrease_key()).
+    The links and cuts are derived from the change in the number of roots,
+    so the plain FibonacciHeap pays nothing for them.
+    '''
+
+    def __init__(self):
+        super().__init__()
+        self.counts = dict.fromkeys(('push', 'pop_min', 'decrease_key', 'links', 'cuts'), 0)
+
+    def roots(self) -> int:
+        'Return the number of trees in the root list'
+        return sum(map(len, self.root_list.values()))
+
+    def push(self, name, key):
+        node = super().push(name, key)
+        self.counts['push'] += 1
+        return node
+
+    def merge(self):
+        # every link makes one of the two roots a child
+        roots = self.roots()
+        super().merge()
+        self.counts['links'] += roots - self.roots()
+
+    def pop_min(self):
+        if self.size > 0:
+            self.counts['pop_min'] += 1
+        return super().pop_min()
+
+    def decrease_key(self, name, new_key):
+        # every cut promotes a node to the root list
+        roots = self.roots()
+        super().decrease_key(name, new_key)
+        self.counts['decrease_key'] += 1
+        self.counts['cuts'] += self.roots() - roots
+
+
 # ### ----- testing -----
 # # help(FibonacciHeap)
 
@@ -0,0 +1,372 @@
+"""
+    The module implements an immutable CSR (compressed sparse row) graph representation.
+
+    Vertex labels are interned to dense ints 0..n-1, and the edges are kept in flat typed arrays:
+        offsets[i] : offsets[i+1]   - the slice of targets (and weights) holding the outgoing edges of vertex i
+        targets                     - the ids of the edges' endpoints, sorted within each slice
+        weights                     - the weights of the edges (None for unweighted graphs),
+                                      typed by their values (see edge_list.weight_array()), and read only when first needed
+    The incoming edges are kept the same way in in_offsets, in_sources and in_weights,
+    but they are only built on first use, see transpose().
+
+    The class exposes the same vertices() / neighbors() / neighbors_incoming() / W surface as AdjacencySet,
+    so the algorithms written for AdjacencySet run on it unchanged.
+    The fast path for int-based algorithms is neighbor_ids(i) / neighbor_ids_incoming(i),
+    which return memoryview slices of the targets array, i.e. ints without any label translation.
+
+    Memory is O(V + E) machine words, instead of a Python set/dict object per vertex
+    and a hash entry per edge.
+"""
+
+from array import array
+from bisect import bisect_left
+from collections.abc import Mapping
+
+import edge_list
+from vertex_interning import VertexInterner
+
+
+class CSRWeightRow(Mapping):
+    'Read-only view of the weights of the outgoing edges of one vertex, akin to AdjacencySet.W[u]'
+
+    def __init__(self, G, i : int):
+        self.G = G
+        self.i = i
+
+    def __getitem__(self, v):
+        G = self.G
+        j = G.index[v] if v in G.index else -1
+        start, stop = G.offsets[self.i], G.offsets[self.i + 1]
+        # targets are sorted within a row, so we can binary search
+        k = bisect_left(G.targets, j, start, stop)
+        if j < 0 or k == stop or G.targets[k] != j:
+            raise KeyError(v)
+        return G.weights[k]
+
+    def __iter__(self):
+        labels = self.G.labels
+        for j in self.G.neighbor_ids(self.i):
+            yield labels[j]
+
+    def __len__(self):
+        return self.G.offsets[self.i + 1] - self.G.offsets[self.i]
+
+    def copy(self) -> dict:
+        'Return the row as a plain dict'
+        return dict(self.items())
+
+
+class CSRWeights(Mapping):
+    'Read-only view of all the weights, akin to AdjacencySet.W'
+
+    def __init__(self, G):
+        self.G = G
+
+    def __getitem__(self, u):
+        G = self.G
+        if not G.weighted or u not in G.index:
+            raise KeyError(u)
+        i = G.index[u]
+        if G.offsets[i] == G.offsets[i + 1]:
+        # AdjacencySet.W only has entries for vertices with outgoing edges
+            raise KeyError(u)
+        return CSRWeightRow(G, i)
+
+    def __iter__(self):
+        G = self.G
+        if not G.weighted:
+            return
+        for i, u in enumerate(G.labels):
+            if G.offsets[i] < G.offsets[i + 1]:
+                yield u
+
+    def __len__(self):
+        return sum(1 for _ in self)
+
+
+class CSRGraph:
+    'Implements an immutable graph in the compressed sparse row format.'
+
+    def __init__(self, labels : list, offsets : array, targets : array, weights : array = None, directed : bool = True,
+                 index = None, in_offsets : array = None, in_sources : array = None, in_weights : array = None):
+        ''' Wrap the given arrays, they aren't copied.
+
+        index (label -> id) is derived from the labels unless it is given precomputed, e.g. by graph_file.open_graph().
+        The incoming edges (in_offsets, in_sources, in_weights) are built lazily, on first use, unless they are given precomputed.
+        '''
+
+        self.directed = directed
+        self.weighted = weights is not None
+        self.labels = labels                                # id -> label
+        if index is None:
+            index = {u : i for i, u in enumerate(labels)}
+        self.index = index                                  # label -> id
+        self.interner = VertexInterner(labels, index)
+        self.offsets = offsets
+        self.targets = targets
+        self._weights = weights
+        self._weight_source = None  # a function returning the weights, for the snapshots that read them lazily
+        self.E = len(targets)
+        self.W = CSRWeights(self)
+
+        if directed:
+            self._in_offsets, self._in_sources, self._in_weights = in_offsets, in_sources, in_weights
+        else:
+        # undirected edges are stored in both directions, so the incoming edges are the outgoing ones
+            self._in_offsets, self._in_sources, self._in_weights = offsets, targets, None
+        self._transpose = None
+
+        # memoryviews make the slices zero-copy
+        self._targets_view = memoryview(self.targets)
+        self._sources_view = None if self._in_sources is None else memoryview(self._in_sources)
+
+    def __getstate__(self):
+        'Pickle without the memoryviews and the cached transpose, they are recreated on demand'
+        self.detach()
+        state = self.__dict__.copy()
+        del state['_targets_view'], state['_sources_view']
+        state['_transpose'] = None
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._targets_view = memoryview(self.targets)
+        self._sources_view = None if self._in_sources is None else memoryview(self._in_sources)
+
+    @property
+    def weights(self):
+        'The weights of the edges, None for unweighted graphs'
+        if self._weight_source is not None:
+            self._weights = edge_list.weight_array(self._weight_source())
+            self._weight_source = None
+        return self._weights
+
+    def detach(self):
+        'Read the lazily read weights now, e.g. before the graph they are read from changes'
+        self.weights
+
+    def build_reverse(self):
+        'Build the incoming edges (in_offsets, in_sources, in_weights) arrays'
+        self._in_offsets, self._in_sources, self._in_weights = self.reverse(len(self.labels), self.offsets,
+                                                                            self.targets, self.weights)
+        self._sources_view = memoryview(self._in_sources)
+
+    @property
+    def in_offsets(self) -> array:
+        'in_offsets[i] : in_offsets[i+1] is the slice of in_sources holding the incoming edges of vertex i'
+        if self._in_offsets is None:
+            self.build_reverse()
+        return self._in_offsets
+
+    @property
+    def in_sources(self) -> array:
+        'The ids of the incoming edges\' sources, sorted within each slice'
+        if self._in_sources is None:
+            self.build_reverse()
+        return self._in_sources
+
+    @property
+    def in_weights(self) -> array:
+        'The weights of the incoming edges, None for unweighted graphs'
+        if not self.directed:
+            return self.weights
+        if self.weighted and self._in_weights is None:
+        # the incoming edges were given precomputed without their weights, so the reverse is rebuilt
+            self.build_reverse()
+        return self._in_weights
+
+    @staticmethod
+    def reverse(n : int, offsets : array, targets : array, weights : array = None) -> (array, array, array):
+        ''' Build the incoming edges (in_offsets, in_sources, in_weights) arrays by sorting the reversed edges.
+
+        Each edge k = (u, v) is packed into the key v*m + k, so one sort orders the edges by (v, u),
+        as the edges are sorted by (u, v) already, and the key gives back the edge's index k for its weight.
+        '''
+        m = len(targets)
+        keys = sorted(edge_list.pack(m, targets, range(m)))
+        targets_sorted, order = edge_list.unpack(m, keys)
+        in_sources = array('i', map(edge_list.row_ids(offsets).__getitem__, order))
+        in_weights = None if weights is None else edge_list.weight_array(map(weights.__getitem__, order))
+        return edge_list.row_offsets(n, targets_sorted), in_sources, in_weights
+
+    def transpose(self):
+        ''' Return the graph with all the edges reversed, as a CSRGraph sharing this graph's arrays.
+
+        The incoming edges are built on the first call and the transpose is cached,
+        so e.g. Kosaraju's SCC or a backward Dijkstra pay for it only when they need it.
+        '''
+        if not self.directed:
+            return self
+        if self._transpose is None:
+            T = CSRGraph(self.labels, self.in_offsets, self.in_sources, self.in_weights, True, self.index,
+                         self.offsets, self.targets, self.weights)
+            T._transpose = self
+            self._transpose = T
+        return self._transpose
+
+    @classmethod
+    def from_adjacency_set(cls, Adj):
+        ''' Build a CSRGraph with the same vertices and edges as the given AdjacencySet.
+
+        The ids are the ones from Adj.interner, if it has one.
+        '''
+        if hasattr(Adj, 'interner'):
+            labels = list(Adj.interner.labels)
+        else:
+            labels = list(Adj.vertices())
+        index = {u : i for i, u in enumerate(labels)}
+
+        offsets = array('q', [0])
+        targets = array('i')
+        for u in labels:
+            targets.extend(sorted(index[v] for v in Adj.neighbors(u)))
+            offsets.append(len(targets))
+
+        G = cls(labels, offsets, targets, None, Adj.directed, index)
+        if Adj.weighted:
+        # the traversals never read the weights, so they are read from Adj only when first needed
+            def read_weights():
+                W = Adj.W
+                for i, u in enumerate(labels):
+                    if offsets[i] < offsets[i + 1]:
+                        W_u = W[u]
+                        for k in range(offsets[i], offsets[i + 1]):
+                            yield W_u[labels[targets[k]]]
+            G.weighted = True
+            G._weight_source = read_weights
+        return G
+
+    @classmethod
+    def from_edgelist(cls, source, directed : bool = True, weighted : bool = False,
+                      label_type = None, report : bool = False, weight_type = float):
+        ''' Build the graph from an edge list in bulk.
+
+        The columns returned by edge_list.load_edgelist() are already sorted by (u, v),
+        so they are used as the targets and weights arrays as they are.
+
+        Parameters
+        ----------
+        source : str / path / iterable
+            A path to an edge list file (plain or gzip), or an iterable of lines or (u, v[, w]) tuples.
+        directed : bool
+            Whether the edges are directed.
+        weighted : bool
+            Whether the third field holds the weight of the edge.
+        label_type : callable
+            Applied to the labels read from text, e.g. int. None keeps the strings.
+        report : bool
+            Print the throughput of the load.
+        weight_type : callable
+            Applied to the weights read from text, e.g. int.
+        '''
+
+        data = edge_list.load_edgelist(source, directed, weighted, label_type, weight_type)
+        labels = data['labels']
+        offsets = edge_list.row_offsets(len(labels), data['us'])
+        G = cls(labels, offsets, data['vs'], data['ws'], directed)
+
+        if report:
+            edge_list.report(data['stats'])
+        return G
+
+    # ----- the int (fast path) surface -----
+
+    def csr(self):
+        'The graph is already in the CSR format, akin to AdjacencySet.csr()'
+        return self
+
+    def id_of(self, u : any) -> int:
+        'Return the dense int id of the vertex labelled u'
+        return self.index[u]
+
+    def label_of(self, i : int) -> any:
+        'Return the label of the vertex with the id i'
+        return self.labels[i]
+
+    def neighbor_ids(self, i : int) -> memoryview:
+        'Return the ids of the neighbors of the vertex i, as a zero-copy slice'
+        return self._targets_view[self.offsets[i] : self.offsets[i + 1]]
+
+    def neighbor_ids_incoming(self, i : int) -> memoryview:
+        'Return the ids of the vertices who\'s neighbor is the vertex i, as a zero-copy slice'
+        if self._sources_view is None:
+            self.build_reverse()
+        return self._sources_view[self.in_offsets[i] : self.in_offsets[i + 1]]
+
+    def degree(self, i : int) -> int:
+        'Return the number of outgoing edges of the vertex i'
+        return self.offsets[i + 1] - self.offsets[i]
+
+    # ----- the AdjacencySet compatible surface -----
+
+    @property
+    def V(self):
+        'The vertex labels, as a set-like view'
+        return self.index.keys()
+
+    def vertices(self):
+        'Return the vertices in the graph'
+        return self.V
+
+    def neighbors(self, u : any) -> list:
+        'Return the list of neighbors of u'
+        if u not in self.index:
+            return []
+        labels = self.labels
+        return [labels[j] for j in self.neighbor_ids(self.index[u])]
+
+    def neighbors_incoming(self, u : any) -> list:
+        'Return the list of vertices who\'s neighbor is u'
+        if u not in self.index:
+            return []
+        labels = self.labels
+        return [labels[j] for j in self.neighbor_ids_incoming(self.index[u])]
+
+    def vertices_outgoing(self):
+        'Return the set vertices with outgoing edges'
+        return {u for i, u in enumerate(self.labels) if self.offsets[i] < self.offsets[i + 1]}
+
+    def vertices_incoming(self):
+        'Return the set vertices with incoming edges'
+        return {u for i, u in enumerate(self.labels) if self.in_offsets[i] < self.in_offsets[i + 1]}
+
+    def __str__(self):
+        s = "Edges are:\n"
+        for i, u in enumerate(self.labels):
+            for k in range(self.offsets[i], self.offsets[i + 1]):
+                v = self.labels[self.targets[k]]
+                if self.directed or v >= u:
+                    s += str(u) + " - " + str(v)
+                    if self.weighted:
+                        s += ', w = ' + str(self.weights[k])
+                    s += "\n"
+        return s
+
+    def __len__(self):
+        return len(self.labels)
+
+
+# from graph_representation import AdjacencySet
+# from dijkstra import Dijkstra
+
+# Adj = AdjacencySet(directed=True, weighted=True)
+# Adj.add_directed('A', 'B', 10)
+# Adj.add_directed('A', 'C', 3)
+# Adj.add_directed('B', 'C', 1)
+# Adj.add_directed('B', 'D', 2)
+# Adj.add_directed('C', 'B', 4)
+# Adj.add_directed('C', 'D', 8)
+# Adj.add_directed('C', 'E', 2)
+# Adj.add_directed('D', 'E', 7)
+# Adj.add_directed('E', 'D', 9)
+
+# G = CSRGraph.from_adjacency_set(Adj)
+# print(G)
+# print(G.neighbors('C'), G.neighbors_incoming('D'))
+# print(list(G.neighbor_ids(G.id_of('C'))))
+
+# d, Pi = Dijkstra.dijkstra(G, 'A')
+# print(d)
+# print(Pi)
+
+# print("Exiting...")
@@ -0,0 +1,431 @@
+"""
+    The module implements a binary on-disk graph format that is reopened via mmap without parsing.
+
+    The file is the CSRGraph's arrays laid out one after another (each section 8-byte aligned):
+        header          - magic, version, flags, n, m and the (offset, size) of each section
+        label data      - int labels as int64s, or str labels as one utf-8 blob
+        label offsets   - the int64 offsets of each str label in the blob (str labels only)
+        label order     - the ids sorted by label, so label -> id is a binary search with no hashmap to build
+        offsets         - int64, n + 1
+        targets         - int32, m
+        weights         - float64, m (weighted graphs only)
+        in offsets      - int64, n + 1 (the same section as offsets for undirected graphs)
+        in sources      - int32, m (the same section as targets for undirected graphs)
+        in weights      - float64, m (weighted graphs only, the same section as weights for undirected graphs)
+
+    open_graph() reads only the header, and wraps the sections as memoryviews over the mapped file.
+    So opening is O(1) regardless of the graph size, the pages are read lazily on first touch,
+    and all the processes that open the same file share the same physical pages of the page cache.
+
+    The module also implements snapshots, a compact and optionally compressed variant of the format
+    for checkpointing graphs, see write_snapshot() and read_snapshot().
+"""
+
+import mmap
+import struct
+import sys
+import zlib
+from array import array
+from bisect import bisect_left
+from collections.abc import Mapping, Sequence
+
+import edge_list
+from graph_csr import CSRGraph
+
+MAGIC = b'CSRG'
+VERSION = 2
+
+DIRECTED = 1
+WEIGHTED = 2
+STR_LABELS = 4
+BIG_ENDIAN = 8
+
+SECTIONS = ('label_data', 'label_offsets', 'label_order', 'offsets', 'targets', 'weights', 'in_offsets', 'in_sources', 'in_weights')
+# magic, version, flags, n, m, then an (offset, size) pair for each section
+HEADER = struct.Struct('<4sHHQQ' + 'QQ' * len(SECTIONS))
+
+
+class LabelTable(Sequence):
+    'Read-only id -> label sequence over the label sections of a mapped file'
+
+    def __init__(self, data : memoryview, offsets : memoryview = None):
+        self.data = data
+        self.offsets = offsets  # None for int labels
+
+    def __getitem__(self, i : int):
+        if self.offsets is None:
+            return self.data[i]
+        if i < 0:
+            i += len(self)
+        if not 0 <= i < len(self):
+            raise IndexError(i)
+        return str(self.data[self.offsets[i] : self.offsets[i + 1]], 'utf-8')
+
+    def __len__(self):
+        if self.offsets is None:
+            return len(self.data)
+        return len(self.offsets) - 1
+
+
+class SortedLabels(Sequence):
+    'The labels in sorted order, for bisect'
+
+    def __init__(self, labels : LabelTable, order : memoryview):
+        self.labels = labels
+        self.order = order
+
+    def __getitem__(self, k : int):
+        return self.labels[self.order[k]]
+
+    def __len__(self):
+        return len(self.order)
+
+
+class LabelIndex(Mapping):
+    'Read-only label -> id mapping via binary search over the sorted labels, akin to CSRGraph.index'
+
+    def __init__(self, labels : LabelTable, order : memoryview):
+        self.labels = labels
+        self.order = order
+        self.sorted = SortedLabels(labels, order)
+
+    def __getitem__(self, label):
+        try:
+            k = bisect_left(self.sorted, label)
+        except TypeError:
+        # the label isn't comparable with the labels in the file, so it can't be one of them
+            raise KeyError(label)
+        if k == len(self.sorted) or self.sorted[k] != label:
+            raise KeyError(label)
+        return self.order[k]
+
+    def __iter__(self):
+        return iter(self.labels)
+
+    def __len__(self):
+        return len(self.labels)
+
+
+def encode_labels(labels : list) -> (int, bytes, array):
+    ''' Encode the labels into a label data section.
+
+    Returns
+    -------
+    (flags, data, offsets)
+        For int labels: 0, the labels as int64s, None.
+        For str labels: STR_LABELS, the utf-8 blob of all labels, the int64 offsets of the labels in the blob.
+
+    Raises
+    ------
+    TypeError
+        If the labels aren't all ints or all strs.
+    '''
+
+    if all(type(u) is int for u in labels):
+        return 0, array('q', labels), None
+    elif all(type(u) is str for u in labels):
+        encoded = [u.encode('utf-8') for u in labels]
+        offsets = array('q', [0])
+        for b in encoded:
+            offsets.append(offsets[-1] + len(b))
+        return STR_LABELS, b''.join(encoded), offsets
+    else:
+        raise TypeError('Only graphs whose labels are all ints or all strs can be written')
+
+
+def encode_weights(weights) -> (int, array):
+    ''' Encode the weights into a weights column, keeping their type.
+
+    Returns
+    -------
+    (flags, weights)
+        For int weights: INT_WEIGHTS, the weights as int64s.
+        For real weights: 0, the weights as float64s.
+
+    Raises
+    ------
+    TypeError
+        If the weights aren't all ints or all ints and floats, e.g. if some are None.
+    '''
+
+    weights = edge_list.weight_array(weights)
+    if not isinstance(weights, array):
+        raise TypeError('Only graphs whose weights are all ints or all ints and floats can be written')
+    return (INT_WEIGHTS if weights.typecode == 'q' else 0), weights
+
+
+def write_graph(Adj, path):
+    ''' Write the graph to a file in the binary format.
+
+    Parameters
+    ----------
+    Adj : AdjacencySet / CSRGraph
+        The graph to write. An AdjacencySet is converted to a CSRGraph first.
+    path : str / path
+        The file to (over)write.
+
+    Raises
+    ------
+    TypeError
+        If the labels aren't all ints or all strs.
+    '''
+
+    G = Adj if isinstance(Adj, CSRGraph) else CSRGraph.from_adjacency_set(Adj)
+    n, m = len(G), G.E
+    labels = list(G.labels)
+
+    flags = 0
+    if G.directed:
+        flags |= DIRECTED
+    if G.weighted:
+        flags |= WEIGHTED
+    if sys.byteorder == 'big':
+        flags |= BIG_ENDIAN
+
+    sections = {}
+    label_flags, sections['label_data'], label_offsets = encode_labels(labels)
+    flags |= label_flags
+    if label_offsets is not None:
+        sections['label_offsets'] = label_offsets
+
+    sections['label_order'] = array('i', sorted(range(n), key=labels.__getitem__))
+    sections['offsets'] = array('q', G.offsets)
+    sections['targets'] = array('i', G.targets)
+    if G.weighted:
+        sections['weights'] = array('d', G.weights)
+    if G.directed:
+        sections['in_offsets'] = array('q', G.in_offsets)
+        sections['in_sources'] = array('i', G.in_sources)
+        if G.weighted:
+            sections['in_weights'] = array('d', G.in_weights)
+
+    # lay out the sections after the header
+    layout = {}
+    position = HEADER.size
+    for name in SECTIONS:
+        if name in sections:
+            size = len(memoryview(sections[name]).cast('B'))
+            layout[name] = (position, size)
+            position += (size + 7) // 8 * 8
+        else:
+            layout[name] = (0, 0)
+    if not G.directed:
+        layout['in_offsets'] = layout['offsets']
+        layout['in_sources'] = layout['targets']
+        layout['in_weights'] = layout['weights']
+
+    fields = []
+    for name in SECTIONS:
+        fields += layout[name]
+
+    with open(path, 'wb') as f:
+        f.write(HEADER.pack(MAGIC, VERSION, flags, n, m, *fields))
+        for name in SECTIONS:
+            if name in sections:
+                f.seek(layout[name][0])
+                f.write(sections[name])
+        # pad the file to the full length of the last section
+        f.truncate(position)
+
+
+def open_graph(path) -> CSRGraph:
+    ''' Open a graph file as a read-only CSRGraph backed by mmap.
+
+    Nothing but the header is read, so this is O(1) regardless of the graph size.
+    The returned graph keeps the mapping alive in its mmap attribute.
+
+    Raises
+    ------
+    ValueError
+        If the file isn't a graph file of this version and byte order.
+    '''
+
+    with open(path, 'rb') as f:
+        mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+    if len(mm) < HEADER.size:
+        raise ValueError('Not a graph file: ' + str(path))
+    magic, version, flags, n, m, *fields = HEADER.unpack_from(mm)
+    if magic != MAGIC or version != VERSION:
+        raise ValueError('Not a graph file of version ' + str(VERSION) + ': ' + str(path))
+    if bool(flags & BIG_ENDIAN) != (sys.byteorder == 'big'):
+        raise ValueError('The graph file was written on a machine of different byte order: ' + str(path))
+
+    buffer = memoryview(mm)
+    typecodes = {
+        'label_data' : 'B' if flags & STR_LABELS else 'q',
+        'label_offsets' : 'q',
+        'label_order' : 'i',
+        'offsets' : 'q',
+        'targets' : 'i',
+        'weights' : 'd',
+        'in_offsets' : 'q',
+        'in_sources' : 'i',
+        'in_weights' : 'd',
+    }
+    views = {}
+    for k, name in enumerate(SECTIONS):
+        position, size = fields[2 * k], fields[2 * k + 1]
+        views[name] = buffer[position : position + size].cast(typecodes[name])
+
+    labels = LabelTable(views['label_data'], views['label_offsets'] if flags & STR_LABELS else None)
+    G = CSRGraph(labels, views['offsets'], views['targets'],
+                 views['weights'] if flags & WEIGHTED else None,
+                 bool(flags & DIRECTED),
+                 index=LabelIndex(labels, views['label_order']),
+                 in_offsets=views['in_offsets'], in_sources=views['in_sources'],
+                 in_weights=views['in_weights'] if flags & WEIGHTED else None)
+    G.mmap = mm
+    return G
+
+
+
+# ----- snapshots -----
+#   A snapshot is the compact, optionally compressed, columnar variant of the format, for checkpoints.
+#   It is read into memory as a whole, rather than mapped:
+#       header          - magic, version, flags, n, m, the size of the label data and of the (compressed) payload
+#       payload         - label offsets (str labels only), label data, offsets, targets,
+#                         weights (weighted only, int64 with the INT_WEIGHTS flag, otherwise float64),
+#                         in offsets and in sources (directed only, if given)
+#   There is no label order, the loading graph class rebuilds the label -> id mapping.
+
+SNAPSHOT_MAGIC = b'GSNP'
+SNAPSHOT_VERSION = 1
+COMPRESSED = 16
+REVERSED = 32
+INT_WEIGHTS = 64
+SNAPSHOT_HEADER = struct.Struct('<4sHHQQQQ')
+
+
+def write_snapshot(path, labels : list, offsets : array, targets : array, weights : array = None,
+                   directed : bool = True, compress : bool = False,
+                   in_offsets : array = None, in_sources : array = None):
+    ''' Write the graph's columns to a snapshot file.
+
+    Parameters
+    ----------
+    path : str / path
+        The file to (over)write.
+    labels : list
+        The vertex labels, labels[i] is the label of the vertex with the id i.
+    offsets, targets, weights : array
+        The graph in the CSR format, see CSRGraph. weights is None for unweighted graphs,
+        int weights are written as ints, and any other numbers as floats.
+    directed : bool
+        Whether the graph is directed.
+    compress : bool
+        Whether to compress the payload with zlib.
+    in_offsets, in_sources : array
+        The incoming edges of a directed graph in the CSR format, saved so that loading doesn't have to sort them.
+
+    Raises
+    ------
+    TypeError
+        If the labels aren't all ints or all strs, or the weights aren't all numbers.
+    '''
+
+    flags, label_data, label_offsets = encode_labels(labels)
+    if directed:
+        flags |= DIRECTED
+    if weights is not None:
+        weight_flags, weights = encode_weights(weights)
+        flags |= WEIGHTED | weight_flags
+    if sys.byteorder == 'big':
+        flags |= BIG_ENDIAN
+
+    columns = [label_data, array('q', offsets), array('i', targets)]
+    if label_offsets is not None:
+        columns.insert(0, label_offsets)
+    if weights is not None:
+        columns.append(weights)
+    if directed and in_offsets is not None:
+        flags |= REVERSED
+        columns += [array('q', in_offsets), array('i', in_sources)]
+    payload = b''.join(bytes(column) for column in columns)
+    if compress:
+        flags |= COMPRESSED
+        payload = zlib.compress(payload, 1)
+
+    with open(path, 'wb') as f:
+        f.write(SNAPSHOT_HEADER.pack(SNAPSHOT_MAGIC, SNAPSHOT_VERSION, flags, len(labels), len(targets),
+                                     len(memoryview(label_data).cast('B')), len(payload)))
+        f.write(payload)
+
+
+def read_snapshot(path) -> dict:
+    ''' Read a snapshot file written by write_snapshot().
+
+    Returns
+    -------
+    dict with the keys labels, offsets, targets, weights (None if unweighted), directed,
+    and in_offsets, in_sources (None if they weren't saved).
+
+    Raises
+    ------
+    ValueError
+        If the file isn't a snapshot of this version.
+    '''
+
+    with open(path, 'rb') as f:
+        header = f.read(SNAPSHOT_HEADER.size)
+        if len(header) < SNAPSHOT_HEADER.size:
+            raise ValueError('Not a graph snapshot: ' + str(path))
+        magic, version, flags, n, m, label_size, payload_size = SNAPSHOT_HEADER.unpack(header)
+        if magic != SNAPSHOT_MAGIC or version != SNAPSHOT_VERSION:
+            raise ValueError('Not a graph snapshot of version ' + str(SNAPSHOT_VERSION) + ': ' + str(path))
+        payload = f.read(payload_size)
+
+    if flags & COMPRESSED:
+        payload = zlib.decompress(payload)
+    payload = memoryview(payload)
+    swap = bool(flags & BIG_ENDIAN) != (sys.byteorder == 'big')
+
+    position = 0
+    def column(typecode : str, count : int) -> array:
+        'Read the next column of the payload'
+        nonlocal position
+        a = array(typecode)
+        a.frombytes(payload[position : position + count * a.itemsize])
+        position += count * a.itemsize
+        if swap:
+            a.byteswap()
+        return a
+
+    if flags & STR_LABELS:
+        label_offsets = column('q', n + 1)
+        blob = payload[position : position + label_size]
+        position += label_size
+        labels = [str(blob[label_offsets[i] : label_offsets[i + 1]], 'utf-8') for i in range(n)]
+    else:
+        labels = column('q', n).tolist()
+
+    offsets = column('q', n + 1)
+    targets = column('i', m)
+    weights = column('q' if flags & INT_WEIGHTS else 'd', m) if flags & WEIGHTED else None
+    in_offsets = column('q', n + 1) if flags & REVERSED else None
+    in_sources = column('i', m) if flags & REVERSED else None
+
+    return {'labels' : labels, 'offsets' : offsets, 'targets' : targets, 'weights' : weights,
+            'directed' : bool(flags & DIRECTED), 'in_offsets' : in_offsets, 'in_sources' : in_sources}
+
+
+# from graph_representation import AdjacencySet
+# from dijkstra import Dijkstra
+
+# Adj = AdjacencySet(directed=True, weighted=True)
+# Adj.add_directed('A', 'B', 10)
+# Adj.add_directed('A', 'C', 3)
+# Adj.add_directed('B', 'C', 1)
+# Adj.add_directed('B', 'D', 2)
+# Adj.add_directed('C', 'E', 2)
+# Adj.add_directed('D', 'E', 7)
+
+# write_graph(Adj, 'graph.csrg')
+# G = open_graph('graph.csrg')
+# print(G)
+# print(Dijkstra.dijkstra(G, 'A'))
+
+# Adj.save('graph.gsnp', compress=True)
+# print(AdjacencySet.load('graph.gsnp'))
+
+# print("Exiting...")
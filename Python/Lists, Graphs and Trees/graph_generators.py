@@ -0,0 +1,258 @@
+"""
+    The module implements seeded generators of synthetic graphs, for benchmarking the graph algorithms at scale.
+
+    Generators:
+        erdos_renyi()       - G(n, m), m uniformly random edges
+        barabasi_albert()   - preferential attachment, a scale-free graph with hubs
+        grid()              - a 2D grid, road-like when some of its streets are dropped
+        random_dag()        - random edges consistent with a random topological order
+        rmat()              - R-MAT (recursive matrix), the Kronecker-like skewed graphs of Graph500
+
+    The vertices are the ints 0..n-1. The same seed always produces the same graph.
+    Each generator draws whole edge columns at once, which are sorted and de-duplicated in bulk
+    (see edge_list.sort_edges()), and built straight into an AdjacencySet via from_csr(),
+    or into the compact CSRGraph if compact is True, bypassing add() per edge.
+    Self-loops are dropped and duplicated edges are merged, so a graph can have fewer edges than drawn.
+
+    The weights are given as a (low, high) range:
+        ints    - uniformly random ints in [low, high], e.g. (-5, 10) for Bellman-Ford
+        floats  - uniformly random floats in [low, high]
+        None    - the graph is unweighted
+    Only random_dag() is guaranteed to have no negative cycles with negative weights.
+"""
+
+import random
+from array import array
+from itertools import compress, repeat
+from math import inf
+from operator import add, mul, ne, rshift
+
+import edge_list
+from graph_csr import CSRGraph
+from graph_representation import AdjacencySet
+
+
+def draw_ints(rng : random.Random, n : int, m : int) -> list:
+    ''' Draw m ints uniformly from range(n).
+
+    Draws 32 random bits per int in a single call, and scales them as (bits * n) >> 32,
+    which is much faster than calling randrange() per int, and the bias is negligible for n << 2**32.
+    '''
+    bits = array('I', rng.randbytes(4 * m))
+    return list(map(rshift, map(mul, bits, repeat(n)), repeat(32)))
+
+
+def draw_weights(rng : random.Random, m : int, weights : tuple) -> list:
+    'Draw m weights uniformly from the range weights = (low, high), returns None if weights is None'
+    if weights is None:
+        return None
+    low, high = weights
+    if isinstance(low, int) and isinstance(high, int):
+        return list(map(add, draw_ints(rng, high - low + 1, m), repeat(low)))
+    return [rng.uniform(low, high) for _ in range(m)]
+
+
+def drop_self_loops(us : list, vs : list) -> (list, list):
+    'Return the edge columns without the edges u->u'
+    keep = list(map(ne, us, vs))
+    return list(compress(us, keep)), list(compress(vs, keep))
+
+
+def build(n : int, us : list, vs : list, ws : list, directed : bool, compact : bool):
+    'Build the graph with the vertices 0..n-1 from the edge columns'
+    us, vs, ws = edge_list.sort_edges(n, us, vs, ws, directed)
+    labels = list(range(n))
+    offsets = edge_list.row_offsets(n, us)
+    if compact:
+        return CSRGraph(labels, offsets, vs, ws, directed)
+    return AdjacencySet.from_csr(labels, offsets, vs, ws, directed)
+
+
+def erdos_renyi(n : int, m : int, directed : bool = True, weights : tuple = None, seed = None,
+                compact : bool = False):
+    ''' Generate an Erdos-Renyi G(n, m) graph, i.e. m edges with uniformly random endpoints.
+
+    Parameters
+    ----------
+    n : int
+        The number of vertices.
+    m : int
+        The number of edges drawn.
+    directed : bool
+        Whether the edges are directed.
+    weights : tuple
+        The (low, high) range of the weights, None for an unweighted graph.
+    seed : any
+        The seed of the random generator.
+    compact : bool
+        Build a CSRGraph instead of an AdjacencySet.
+    '''
+    rng = random.Random(seed)
+    us, vs = drop_self_loops(draw_ints(rng, n, m), draw_ints(rng, n, m))
+    return build(n, us, vs, draw_weights(rng, len(us), weights), directed, compact)
+
+
+def barabasi_albert(n : int, k : int, directed : bool = False, weights : tuple = None, seed = None,
+                    compact : bool = False):
+    ''' Generate a Barabasi-Albert graph by preferential attachment.
+
+    The vertices k..n-1 arrive one by one, and each is connected to k distinct earlier vertices,
+    chosen with probabilities proportional to their degrees, so early vertices become hubs.
+    If directed, the edges lead from the new vertices to the earlier ones, akin to citations.
+    The other parameters are the same as for erdos_renyi().
+    '''
+    rng = random.Random(seed)
+    choice = rng.choice
+    us, vs = [], []
+    targets = list(range(k))
+    repeated = []   # every vertex appears once per each of its edges, so a uniform choice is degree-proportional
+    for u in range(k, n):
+        us.extend(repeat(u, k))
+        vs.extend(targets)
+        repeated.extend(targets)
+        repeated.extend(repeat(u, k))
+
+        chosen = set()
+        while len(chosen) < k:
+            chosen.add(choice(repeated))
+        targets = list(chosen)
+
+    return build(n, us, vs, draw_weights(rng, len(us), weights), directed, compact)
+
+
+def grid(rows : int, cols : int, drop : float = 0.0, directed : bool = False, weights : tuple = None, seed = None,
+         compact : bool = False):
+    ''' Generate a 2D grid, the vertex r * cols + c being connected to its right and lower neighbors.
+
+    Dropping a fraction of the streets at random makes it road-like, i.e. with detours and dead ends.
+    If directed, each street is a pair of one-way edges with independent weights.
+
+    Parameters
+    ----------
+    rows, cols : int
+        The size of the grid.
+    drop : float
+        The probability of dropping a street.
+    The other parameters are the same as for erdos_renyi().
+    '''
+    rng = random.Random(seed)
+    n = rows * cols
+    us = [u for u in range(n) if (u + 1) % cols != 0]   # the streets to the right
+    vs = [u + 1 for u in us]
+    down = range(n - cols)                              # the streets down
+    us.extend(down)
+    vs.extend(u + cols for u in down)
+
+    if drop > 0:
+        random_ = rng.random
+        keep = [random_() >= drop for _ in range(len(us))]
+        us, vs = list(compress(us, keep)), list(compress(vs, keep))
+    if directed:
+        us, vs = us + vs, vs + us
+
+    return build(n, us, vs, draw_weights(rng, len(us), weights), directed, compact)
+
+
+def random_dag(n : int, m : int, weights : tuple = None, seed = None, compact : bool = False):
+    ''' Generate a random directed acyclic graph with m edges drawn.
+
+    A random permutation of the vertices serves as the topological order,
+    and each edge leads from the earlier of its endpoints to the later one.
+    There are no cycles, so negative weights are safe.
+    The other parameters are the same as for erdos_renyi().
+    '''
+    rng = random.Random(seed)
+    order = list(range(n))
+    rng.shuffle(order)
+    firsts, seconds = drop_self_loops(draw_ints(rng, n, m), draw_ints(rng, n, m))
+    us = [order[min(a, b)] for a, b in zip(firsts, seconds)]
+    vs = [order[max(a, b)] for a, b in zip(firsts, seconds)]
+    return build(n, us, vs, draw_weights(rng, len(us), weights), True, compact)
+
+
+def rmat(scale : int, edge_factor : int = 16, a : float = 0.57, b : float = 0.19, c : float = 0.19,
+         directed : bool = True, permute : bool = True, weights : tuple = None, seed = None, compact : bool = False):
+    ''' Generate an R-MAT graph with 2**scale vertices and edge_factor * 2**scale edges drawn.
+
+    Each edge picks a quadrant of the adjacency matrix with the probabilities a, b, c and d = 1 - a - b - c,
+    then recursively a quadrant within it, scale times, i.e. once per bit of its endpoints.
+    The default probabilities are those of Graph500, giving a skewed degree distribution.
+
+    Parameters
+    ----------
+    scale : int
+        The log2 of the number of vertices.
+    edge_factor : int
+        The number of edges drawn per vertex.
+    a, b, c : float
+        The probabilities of the top-left, top-right and bottom-left quadrants.
+    permute : bool
+        Relabel the vertices randomly, so the hubs aren't the low ids.
+    The other parameters are the same as for erdos_renyi().
+    '''
+    rng = random.Random(seed)
+    n = 1 << scale
+    m = edge_factor * n
+    quadrants = (a, b, c, 1 - a - b - c)
+
+    us, vs = [0] * m, [0] * m
+    level = 0
+    while level < scale:
+    # draw up to 4 levels at once, as one of the 4**L combinations of their quadrants
+        L = min(4, scale - level)
+        probabilities, row_bits, col_bits = [], [], []
+        for o in range(4 ** L):
+            p, row, col = 1.0, 0, 0
+            for shift in range(L - 1, -1, -1):
+                q = (o >> (2 * shift)) & 3
+                p *= quadrants[q]
+                row = (row << 1) | (q >> 1)
+                col = (col << 1) | (q & 1)
+            probabilities.append(p)
+            row_bits.append(row)
+            col_bits.append(col)
+
+        draws = rng.choices(range(4 ** L), weights=probabilities, k=m)
+        us = [(u << L) | row_bits[o] for u, o in zip(us, draws)]
+        vs = [(v << L) | col_bits[o] for v, o in zip(vs, draws)]
+        level += L
+
+    if permute:
+        order = list(range(n))
+        rng.shuffle(order)
+        us = list(map(order.__getitem__, us))
+        vs = list(map(order.__getitem__, vs))
+
+    us, vs = drop_self_loops(us, vs)
+    return build(n, us, vs, draw_weights(rng, len(us), weights), directed, compact)
+
+
+def weight_matrix(Adj) -> list:
+    'Return the weight matrix of the graph, indexed by the vertex ids, e.g. for shortest_paths.floyd_warshall()'
+    G = Adj.csr()
+    n = len(G)
+    w = [[inf] * n for _ in range(n)]
+    for u in range(n):
+        row = w[u]
+        for k in range(G.offsets[u], G.offsets[u + 1]):
+            row[G.targets[k]] = G.weights[k] if G.weighted else 1
+    return w
+
+
+# from time import perf_counter
+
+# from dijkstra import Dijkstra
+
+# for generate in (lambda: erdos_renyi(100000, 1000000, weights=(1, 100), seed=1),
+#                  lambda: barabasi_albert(100000, 5, weights=(1, 100), seed=1),
+#                  lambda: grid(300, 300, drop=0.1, weights=(1, 100), seed=1),
+#                  lambda: random_dag(100000, 1000000, weights=(-10, 100), seed=1),
+#                  lambda: rmat(16, weights=(1, 100), seed=1)):
+#     start = perf_counter()
+#     Adj = generate()
+#     print(len(Adj), 'vertices,', Adj.E, 'edges in', '%.3f' % (perf_counter() - start), 's')
+#     start = perf_counter()
+#     Dijkstra.dijkstra(Adj, 0)
+#     print('Dijkstra in', '%.3f' % (perf_counter() - start), 's')
+
+# print("Exiting...")
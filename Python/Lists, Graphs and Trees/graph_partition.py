@@ -0,0 +1,456 @@
+"""
+    The module implements graph partitioning and a sharded graph for multi-process algorithms.
+
+    Partitioning assigns each vertex (by its int id in the graph's CSR snapshot) to one of k parts:
+        hash_partition()                - scatters the ids by a multiplicative hash, balanced but with a large edge cut
+        bfs_partition()                 - grows each part by BFS, so the parts are mostly connected
+        label_propagation_partition()   - refines a partition by moving vertices to the part most of their neighbors are in
+
+    A ShardedGraph splits the graph into one Shard per part. A shard holds only the outgoing edges of its owned vertices,
+    plus a boundary table of its ghost vertices, i.e. the vertices owned by other shards that its edges lead to.
+    Each shard is run by its own worker process, that keeps the algorithm's state of the owned vertices.
+    The algorithms proceed in rounds, and the only data exchanged between the rounds are the updates of ghost vertices,
+    which the coordinating process routes to their owners:
+        sharded_BFS()               - the level-synchronous frontier loop of BFS.BFS_list
+        sharded_bellman_ford()      - the rounds of edge relaxation of bellman_ford_sssp
+"""
+
+import multiprocessing
+from array import array
+from collections import deque
+
+from vertex_interning import DenseMap
+
+
+# ----- partitioning -----
+
+def hash_partition(Adj, k : int) -> array:
+    'Assign the vertex with the id i to the part hash(i) % k'
+    G = Adj.csr()
+    # Knuth's multiplicative hash spreads consecutive ids over the parts
+    return array('i', ((i * 2654435761) % 2**32 % k for i in range(len(G))))
+
+
+def undirected_neighbor_ids(G, u : int):
+    'Iterate over the ids of both the outgoing and the incoming neighbors of u'
+    yield from G.neighbor_ids(u)
+    if G.directed:
+        yield from G.neighbor_ids_incoming(u)
+
+
+def bfs_partition(Adj, k : int) -> array:
+    ''' Grow the parts one by one via BFS, ignoring the direction of the edges.
+
+    A part is closed when it reaches ceil(n / k) vertices, and the next one continues from the BFS queue,
+    so the neighboring parts are adjacent too. When a component is exhausted, BFS restarts from a new seed.
+    '''
+    G = Adj.csr()
+    n = len(G)
+    capacity = -(-n // k)
+
+    part = array('i', [-1]) * n
+    p = size = 0
+    queue = deque()
+    for seed in range(n):
+        if part[seed] >= 0:
+            continue
+        queue.append(seed)
+        while len(queue) > 0:
+            u = queue.popleft()
+            if part[u] >= 0:
+            # u was enqueued more than once
+                continue
+            part[u] = p
+            size += 1
+            if size == capacity:
+                p += 1
+                size = 0
+            for v in undirected_neighbor_ids(G, u):
+                if part[v] < 0:
+                    queue.append(v)
+    return part
+
+
+def label_propagation_partition(Adj, k : int, rounds : int = 10, slack : float = 0.05, part : array = None) -> array:
+    ''' Refine a partition by label propagation.
+
+    In each round, every vertex moves to the part that most of its neighbors are in,
+    unless that part is already full, i.e. it has (1 + slack) * n / k vertices.
+    Stops after the given number of rounds, or when no vertex moves.
+
+    Parameters
+    ----------
+    Adj : AdjacencySet / CSRGraph
+        The graph.
+    k : int
+        The number of parts.
+    rounds : int
+        The maximum number of rounds.
+    slack : float
+        How much larger than n / k the parts are allowed to grow.
+    part : array
+        The partition to start from, bfs_partition() by default.
+    '''
+    G = Adj.csr()
+    n = len(G)
+    part = bfs_partition(G, k) if part is None else array('i', part)
+    capacity = (1 + slack) * n / k
+
+    sizes = [0] * k
+    for p in part:
+        sizes[p] += 1
+
+    for _ in range(rounds):
+        moved = 0
+        for u in range(n):
+            counts = {}
+            for v in undirected_neighbor_ids(G, u):
+                counts[part[v]] = counts.get(part[v], 0) + 1
+            if len(counts) == 0:
+                continue
+            best = max(counts, key=counts.__getitem__)
+            p = part[u]
+            if best != p and counts[best] > counts.get(p, 0) and sizes[best] + 1 <= capacity:
+                sizes[p] -= 1
+                sizes[best] += 1
+                part[u] = best
+                moved += 1
+        if moved == 0:
+            break
+    return part
+
+
+def edge_cut(Adj, part : array) -> int:
+    'Return the number of edges whose endpoints are in different parts'
+    G = Adj.csr()
+    return sum(1 for u in range(len(G)) for v in G.neighbor_ids(u) if part[u] != part[v])
+
+
+# ----- sharding -----
+
+class Shard:
+    ''' Implements one part of a sharded graph.
+
+    owned   - the ids of the vertices owned by the shard
+    local   - maps the owned ids to their local indices, i.e. indices into owned
+    offsets, targets, weights
+            - the outgoing edges of the owned vertices in the CSR format, indexed by the local indices,
+              the targets are (global) ids
+    ghosts  - the boundary table, maps the ids of the not owned targets to the parts that own them
+    '''
+
+    def __init__(self, G, part : array, p : int):
+        self.p = p
+        self.owned = array('i', (u for u in range(len(G)) if part[u] == p))
+        self.local = {u : i for i, u in enumerate(self.owned)}
+        self.offsets = array('q', [0])
+        self.targets = array('i')
+        weights = G.weights
+        self.weights = None if weights is None else weights[:0]  # of the same type as the graph's weights
+        self.ghosts = {}
+
+        for u in self.owned:
+            start, stop = G.offsets[u], G.offsets[u + 1]
+            self.targets.extend(G.targets[start : stop])
+            if weights is not None:
+                self.weights.extend(weights[start : stop])
+            self.offsets.append(len(self.targets))
+            for v in G.neighbor_ids(u):
+                if part[v] != p:
+                    self.ghosts[v] = part[v]
+
+    def __len__(self):
+        return len(self.owned)
+
+
+class ShardWorker:
+    ''' Runs the algorithms' rounds on one shard, keeping the state of the owned vertices.
+
+    Each round returns the outboxes, i.e. the updates of the ghost vertices grouped by their owners.
+    '''
+
+    def __init__(self, shard : Shard, k : int):
+        self.shard = shard
+        self.k = k
+
+    # --- BFS ---
+
+    def bfs_init(self):
+        n = len(self.shard)
+        self.level = array('i', [-1]) * n
+        self.parent = array('i', [DenseMap.MISSING]) * n
+        self.frontier = []
+
+    def bfs_step(self, inbox : list, lvl : int) -> (list, int):
+        ''' Accept the vertices discovered by other shards at level lvl, then expand the frontier to level lvl + 1.
+
+        Returns the outboxes and the size of the new local frontier.
+        '''
+        shard, level, parent = self.shard, self.level, self.parent
+        local = shard.local
+
+        # the remote discoveries join the frontier
+        for v, u in inbox:
+            i = local[v]
+            if level[i] < 0:
+                level[i] = lvl
+                parent[i] = u
+                self.frontier.append(i)
+
+        outboxes = [[] for _ in range(self.k)]
+        next = []
+        for i in self.frontier:
+            u = shard.owned[i]
+            for k in range(shard.offsets[i], shard.offsets[i + 1]):
+                v = shard.targets[k]
+                if v in shard.ghosts:
+                    outboxes[shard.ghosts[v]].append((v, u))
+                else:
+                    j = local[v]
+                    if level[j] < 0:
+                        level[j] = lvl + 1
+                        parent[j] = u
+                        next.append(j)
+        self.frontier = next
+
+        return outboxes, len(next)
+
+    def bfs_result(self) -> (array, array, array):
+        return self.shard.owned, self.parent, self.level
+
+    # --- Bellman-Ford ---
+
+    def bf_init(self):
+        self.dp = [float('Inf')] * len(self.shard)   # a list keeps the type of the weights, as in bellman_ford_sssp
+        self.changed = set()
+
+    def bf_step(self, inbox : list) -> (list, int):
+        ''' Apply the relaxations of the owned vertices sent by other shards,
+        then relax the outgoing edges of the vertices whose dp changed.
+
+        Returns the outboxes, with one (the smallest) candidate per ghost vertex,
+        and the number of the owned vertices whose dp changed.
+        '''
+        shard, dp = self.shard, self.dp
+        local = shard.local
+
+        for v, d in inbox:
+            i = local[v]
+            if d < dp[i]:
+                dp[i] = d
+                self.changed.add(i)
+
+        candidates = {}
+        changed = set()
+        for i in self.changed:
+            for k in range(shard.offsets[i], shard.offsets[i + 1]):
+                v = shard.targets[k]
+                d = dp[i] + shard.weights[k]
+                if v in shard.ghosts:
+                    if d < candidates.get(v, float('Inf')):
+                        candidates[v] = d
+                else:
+                    j = local[v]
+                    if d < dp[j]:
+                        dp[j] = d
+                        changed.add(j)
+        self.changed = changed
+
+        outboxes = [[] for _ in range(self.k)]
+        for v, d in candidates.items():
+            outboxes[shard.ghosts[v]].append((v, d))
+        return outboxes, len(changed)
+
+    def bf_result(self) -> (array, list):
+        return self.shard.owned, self.dp
+
+
+def worker_loop(conn, worker : ShardWorker):
+    'The main loop of a worker process: call the worker\'s methods as the coordinator requests'
+    while True:
+        method, args = conn.recv()
+        if method is None:
+            break
+        conn.send(getattr(worker, method)(*args))
+    conn.close()
+
+
+class ShardedGraph:
+    ''' Implements a facade over the shards of a graph and their worker processes.
+
+    Parameters
+    ----------
+    Adj : AdjacencySet / CSRGraph
+        The graph to shard.
+    part : array
+        The partition, part[i] is the part of the vertex with the id i, see the partitioning functions.
+    processes : bool
+        If True, every shard runs in its own worker process, otherwise they all run in this process.
+
+    Use as a context manager, or call close(), to stop the worker processes.
+    '''
+
+    def __init__(self, Adj, part : array, processes : bool = True):
+        G = Adj.csr()
+        self.directed = G.directed
+        self.weighted = G.weighted
+        self.interner = G.interner
+        self.n = len(G)
+        self.k = max(part) + 1 if len(part) > 0 else 1
+        self.part = array('i', part)
+        self.shards = [Shard(G, self.part, p) for p in range(self.k)]
+
+        self.workers = [ShardWorker(shard, self.k) for shard in self.shards]
+        self.connections = None
+        if processes:
+            self.connections = []
+            self.processes = []
+            for worker in self.workers:
+                conn, worker_conn = multiprocessing.Pipe()
+                process = multiprocessing.Process(target=worker_loop, args=(worker_conn, worker), daemon=True)
+                process.start()
+                self.connections.append(conn)
+                self.processes.append(process)
+
+    def call(self, method : str, args_per_shard : list = None) -> list:
+        'Call the method on every shard\'s worker, in parallel if they run in processes, and return their results'
+        if args_per_shard is None:
+            args_per_shard = [()] * self.k
+        if self.connections is None:
+            return [getattr(worker, method)(*args) for worker, args in zip(self.workers, args_per_shard)]
+
+        for conn, args in zip(self.connections, args_per_shard):
+            conn.send((method, args))
+        return [conn.recv() for conn in self.connections]
+
+    def route(self, outboxes_per_shard : list) -> list:
+        'Turn the outboxes of every shard into the inboxes of every shard'
+        inboxes = [[] for _ in range(self.k)]
+        for outboxes in outboxes_per_shard:
+            for p, outbox in enumerate(outboxes):
+                inboxes[p] += outbox
+        return inboxes
+
+    def boundary_size(self) -> int:
+        'Return the total number of ghost vertices over all the shards'
+        return sum(len(shard.ghosts) for shard in self.shards)
+
+    def close(self):
+        'Stop the worker processes'
+        if self.connections is not None:
+            for conn, process in zip(self.connections, self.processes):
+                conn.send((None, None))
+                process.join()
+                conn.close()
+            self.connections = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def __len__(self):
+        return self.n
+
+
+def sharded_BFS(s, SG : ShardedGraph) -> (DenseMap, DenseMap):
+    ''' Level-synchronous BFS over the shards, akin to BFS.BFS_list.
+
+    In each round, every shard expands its part of the frontier by one level,
+    and sends the discovered ghost vertices to their owners, which add them to their next frontiers.
+    The levels are identical to BFS_list's, a parent may be any vertex of the previous level.
+
+    Returns
+    -------
+    (parent : DenseMap, level : DenseMap)
+    '''
+    source = SG.interner.id(s)
+    SG.call('bfs_init')
+
+    inboxes = [[] for _ in range(SG.k)]
+    inboxes[SG.part[source]].append((source, DenseMap.NONE))
+    lvl = 0
+    while True:
+        results = SG.call('bfs_step', [(inbox, lvl) for inbox in inboxes])
+        inboxes = SG.route([outboxes for outboxes, _ in results])
+        if all(len(inbox) == 0 for inbox in inboxes) and all(size == 0 for _, size in results):
+            break
+        lvl += 1
+
+    parent = array('i', [DenseMap.MISSING]) * SG.n
+    level = array('i', [-1]) * SG.n
+    for owned, shard_parent, shard_level in SG.call('bfs_result'):
+        for i, u in enumerate(owned):
+            parent[u] = shard_parent[i]
+            level[u] = shard_level[i]
+
+    return DenseMap(SG.interner, parent, DenseMap.MISSING, labelled=True), DenseMap(SG.interner, level, -1)
+
+
+def sharded_bellman_ford(SG : ShardedGraph, s) -> DenseMap:
+    ''' Bellman-Ford over the shards, akin to bellman_ford_sssp.
+
+    In each round, every shard relaxes the outgoing edges of its vertices whose dp changed in the previous round,
+    and sends the best candidate for each ghost vertex to its owner, which applies it in the next round.
+    Each round advances the distances by one edge, after the first one seeds the source,
+    so a path of N-1 edges takes N rounds, the last one applying the candidates routed in the one before.
+    Stops when nothing changes, or after N rounds.
+
+    Returns
+    -------
+    dp : DenseMap
+        The shortest path lengths from s, float('Inf') for unreachable vertices.
+    '''
+    source = SG.interner.id(s)
+    SG.call('bf_init')
+
+    inboxes = [[] for _ in range(SG.k)]
+    inboxes[SG.part[source]].append((source, 0))
+    for _ in range(max(SG.n, 1)):
+        results = SG.call('bf_step', [(inbox,) for inbox in inboxes])
+        inboxes = SG.route([outboxes for outboxes, _ in results])
+        if all(len(inbox) == 0 for inbox in inboxes) and all(changed == 0 for _, changed in results):
+            break
+
+    dp = [float('Inf')] * SG.n
+    for owned, shard_dp in SG.call('bf_result'):
+        for i, u in enumerate(owned):
+            dp[u] = shard_dp[i]
+
+    return DenseMap(SG.interner, dp)
+
+
+# from graph_representation import AdjacencySet
+
+# Adj = AdjacencySet(directed=True, weighted=True)
+# for u in range(20):
+#     Adj.add(u, (u + 1) % 20, 1)
+#     Adj.add(u, (u * 7) % 20, 5)
+
+# part = label_propagation_partition(Adj, 4)
+# print(list(part), edge_cut(Adj, part))
+
+# if __name__ == '__main__':
+#     with ShardedGraph(Adj, part) as SG:
+#         print(sharded_BFS(0, SG))
+#         print(sharded_bellman_ford(SG, 0))
+
+# print("Exiting...")
+
+
+if __name__ == '__main__':
+    import importlib
+    from graph_representation import AdjacencySet
+    bellman_ford = importlib.import_module('bellman-ford')
+
+    # a path whose every hop, the last one included, crosses to another shard
+    Path = AdjacencySet(directed=True, weighted=True)
+    Path.add(0, 1, 1)
+    Path.add(1, 2, 1)
+    with ShardedGraph(Path, array('i', [0, 1, 2]), processes=False) as SG:
+        dp = sharded_bellman_ford(SG, 0)
+    expected = bellman_ford.bellman_ford_sssp(Path, 0)
+    assert {u : dp[u] for u in dp} == {u : expected[u] for u in expected} == {0 : 0, 1 : 1, 2 : 2}
+    assert all(type(dp[u]) is int for u in dp)
+    print("sharded_bellman_ford matches bellman_ford_sssp")
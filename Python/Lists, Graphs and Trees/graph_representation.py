@@ -1,11 +1,20 @@
 """ 
     The module includes two variations on the adjacency lists graph representation.
     1) The 'classic' approach for graph representation via an array of linked lists.
+       1b) The same linked lists, but packed into typed arrays, with no object per edge.
     2) A cleaner approach for graph representation via a hashmap of hashsets.
 """
 
 # 1) the array of linked lists approach:
 from lists import LinkedList
+from array import array
+from collections import defaultdict
+from time import perf_counter
+import edge_list
+import graph_file
+from graph_csr import CSRGraph
+from union_find import UnionFind
+from vertex_interning import VertexInterner
 
 class AdjacencyList:
     'Implements the adjacency lists as an array of linked lists.'
@@ -16,6 +25,60 @@ class AdjacencyList:
         self.directed = directed
         pass
 
+    @classmethod
+    def from_edgelist(cls, source, directed : bool = True, report : bool = False):
+        ''' Build the graph from an edge list in bulk.
+
+        The vertices must be ints, the graph gets n = max(vertex) + 1 vertices.
+        Duplicated edges are dropped.
+
+        Parameters
+        ----------
+        source : str / path / iterable
+            A path to an edge list file (plain or gzip), or an iterable of lines or (u, v) tuples.
+        directed : bool
+            Whether the edges are directed.
+        report : bool
+            Print the throughput of the load.
+        '''
+
+        data = edge_list.load_edgelist(source, directed, label_type=int)
+        labels, us, vs = data['labels'], data['us'], data['vs']
+
+        Adj = cls(max(labels) + 1 if labels else 0, directed)
+        # the columns are already symmetric for undirected graphs, so we bypass add()
+        for u, v in zip(us, vs):
+            Adj.a[labels[u]].add_tail(labels[v])
+
+        if report:
+            edge_list.report(data['stats'])
+        return Adj
+
+    def save(self, path, compress : bool = False):
+        'Save the graph to a snapshot file, see graph_file.write_snapshot()'
+        offsets = array('q', [0])
+        targets = array('i')
+        for adj_u in self.a:
+            aux = adj_u.head
+            while aux is not None:
+                targets.append(aux.val)
+                aux = aux.next
+            offsets.append(len(targets))
+        graph_file.write_snapshot(path, list(range(self.n)), offsets, targets, None, self.directed, compress)
+
+    @classmethod
+    def load(cls, path):
+        'Load a graph from a snapshot file written by save()'
+        data = graph_file.read_snapshot(path)
+        labels, offsets, targets = data['labels'], data['offsets'], data['targets']
+
+        Adj = cls(max(labels) + 1 if labels else 0, data['directed'])
+        for i, u in enumerate(labels):
+            adj_u = Adj.a[u]
+            for k in range(offsets[i], offsets[i + 1]):
+                adj_u.add_tail(labels[targets[k]])
+        return Adj
+
     def add(self, u : int, v : int):
         if 0 <= u and u < self.n and 0 <= v and v < self.n:
             self.a[u].add_tail(v)
@@ -34,22 +97,259 @@ class AdjacencyList:
         return s
 
 
+# 1b) the array of linked lists approach, packed into typed arrays:
+
+class CompactAdjacencyList:
+    ''' Implements the adjacency lists as linked lists in a single pool of edges.
+
+    Instead of a LinkedList object per vertex and a Node object per edge (100+ bytes per edge),
+    the edges are kept in typed arrays, using 8 bytes per edge:
+        to[e]   - the endpoint of the edge e
+        next[e] - the edge after e in its list, -1 at the tail
+    and each vertex u has its list's first and last edges in head[u] and tail[u].
+    The arrays grow in amortized O(1), so appends stay O(1), just like LinkedList.add_tail().
+    '''
+
+    def __init__(self, n : int, directed : bool = True):
+        self.n = n
+        self.head = array('i', [-1]) * n
+        self.tail = array('i', [-1]) * n
+        self.to = array('i')
+        self.next = array('i')
+        self.directed = directed
+
+    @classmethod
+    def from_edgelist(cls, source, directed : bool = True, report : bool = False):
+        ''' Build the graph from an edge list in bulk, akin to AdjacencyList.from_edgelist().
+
+        The vertices must be ints, the graph gets n = max(vertex) + 1 vertices.
+        Duplicated edges are dropped.
+        '''
+
+        data = edge_list.load_edgelist(source, directed, label_type=int)
+        labels, us, vs = data['labels'], data['us'], data['vs']
+
+        Adj = cls(max(labels) + 1 if labels else 0, directed)
+        # the columns are already symmetric for undirected graphs, so we bypass add()
+        for u, v in zip(us, vs):
+            Adj.add_tail(labels[u], labels[v])
+
+        if report:
+            edge_list.report(data['stats'])
+        return Adj
+
+    def add_tail(self, u : int, v : int):
+        'Append the edge u->v to the tail of u\'s list'
+        e = len(self.to)
+        self.to.append(v)
+        self.next.append(-1)
+        if self.tail[u] < 0:
+            self.head[u] = e
+        else:
+            self.next[self.tail[u]] = e
+        self.tail[u] = e
+
+    def add(self, u : int, v : int):
+        if 0 <= u and u < self.n and 0 <= v and v < self.n:
+            self.add_tail(u, v)
+            if not self.directed:
+                self.add_tail(v, u)
+
+    def neighbors(self, u : int):
+        'Iterate over the neighbors of u, in the order of insertion'
+        to, next = self.to, self.next
+        e = self.head[u]
+        while e >= 0:
+            yield to[e]
+            e = next[e]
+
+    def __str__(self):
+        s = "Edges are:\n"
+        for u in range(self.n):
+            for v in self.neighbors(u):
+                if self.directed or v >= u:
+                    s = s + str(u) + " - " + str(v) + "\n"
+        return s
+
+
 # 2) the cleaner approach:
 
 class AdjacencySet:
     'Implements adjacency list as a hashmap of hashsets.'
 
-    def __init__(self, directed : bool = True, weighted : bool = False):
+    def __init__(self, directed : bool = True, weighted : bool = False, incoming : bool = True,
+                 track_components : bool = False):
+        ''' If incoming is False, the incoming edges (tofrom) aren't kept, halving the memory of the edges.
+        neighbors_incoming() then falls back to the transpose of the CSR snapshot, see transpose().
+        If track_components is True, add() keeps the connected components up to date, see same_component().
+        '''
         self.directed = directed
         self.weighted = weighted
+        self.incoming = incoming
         self.fromto = {}    # keeps the outgoing edges
-        self.tofrom = {}    # keeps the incoming edges
+        self.tofrom = {}    # keeps the incoming edges, if incoming
         self.W = {}         # keeps the weights of edges
         self.V = set()
         self.E = 0
+        self.version = 0    # incremented on every modification, so caches of results can detect staleness
+        self._interner = VertexInterner()   # label <-> dense int id
+        self._interner_stale = False        # True if vertices were removed since the ids were assigned
+        self._csr = None    # cached CSRGraph snapshot for the int-based algorithms
+        self.track_components = track_components
+        self._components = UnionFind() if track_components else None    # over the interner's ids
+
+    @classmethod
+    def from_edgelist(cls, source, directed : bool = True, weighted : bool = False,
+                      label_type = None, report : bool = False, incoming : bool = True,
+                      weight_type = float):
+        ''' Build the graph from an edge list in bulk.
+
+        Instead of walking add() per edge, the edges are parsed in chunks by edge_list.read_chunks(),
+        and fromto, tofrom (if incoming) and W are filled in a single tight pass over the columns.
+        The sets (and W's dicts) de-duplicate the edges, which is cheaper than sorting in pure Python.
+
+        Parameters
+        ----------
+        source : str / path / iterable
+            A path to an edge list file (plain or gzip), or an iterable of lines or (u, v[, w]) tuples.
+        directed : bool
+            Whether the edges are directed.
+        weighted : bool
+            Whether the third field holds the weight of the edge.
+        label_type : callable
+            Applied to the labels read from text, e.g. int. None keeps the strings.
+        report : bool
+            Print the throughput of the load.
+        incoming : bool
+            Whether to keep the incoming edges, see __init__().
+        weight_type : callable
+            Applied to the weights read from text, e.g. int.
+        '''
+
+        start = perf_counter()
+        n_lines = n_read = 0
+        fromto = defaultdict(set)
+        tofrom = defaultdict(set)
+        W = defaultdict(dict)
+        heads = set()   # the targets of the edges, if the incoming edges aren't kept
+
+        for u_col, v_col, w_col, lines in edge_list.read_chunks(source, weighted):
+            n_lines += lines
+            n_read += len(u_col)
+            if label_type is not None:
+                u_col = list(map(label_type, u_col))
+                v_col = list(map(label_type, v_col))
+
+            if incoming:
+                for u, v in zip(u_col, v_col):
+                    fromto[u].add(v)
+                    tofrom[v].add(u)
+                if not directed:
+                    for u, v in zip(u_col, v_col):
+                        fromto[v].add(u)
+                        tofrom[u].add(v)
+            else:
+                for u, v in zip(u_col, v_col):
+                    fromto[u].add(v)
+                if not directed:
+                    for u, v in zip(u_col, v_col):
+                        fromto[v].add(u)
+                # the vertices without outgoing edges still have to be known
+                heads.update(v_col)
+
+            if weighted:
+                w_col = map(weight_type, w_col)
+                if directed:
+                    for u, v, w in zip(u_col, v_col, w_col):
+                        W[u][v] = w
+                else:
+                    for u, v, w in zip(u_col, v_col, w_col):
+                        W[u][v] = w
+                        W[v][u] = w
+
+        Adj = cls(directed, weighted, incoming)
+        Adj.fromto = dict(fromto)
+        Adj.tofrom = dict(tofrom) if incoming else {}
+        Adj.W = dict(W)
+        Adj.V = set(fromto)
+        Adj.V.update(tofrom)
+        Adj.V.update(heads)
+        Adj.E = sum(map(len, fromto.values()))
+        for u in fromto:
+            Adj._interner.intern(u)
+        for v in tofrom:
+            Adj._interner.intern(v)
+        for v in heads:
+            Adj._interner.intern(v)
+
+        if report:
+            edge_list.report(edge_list.make_stats(start, n_lines, n_read, len(Adj.V), Adj.E))
+        return Adj
+
+    @classmethod
+    def from_csr(cls, labels : list, offsets : array, targets : array, weights : array = None, directed : bool = True,
+                 in_offsets : array = None, in_sources : array = None, incoming : bool = True):
+        ''' Build the graph from the CSR arrays (see CSRGraph) in a single pass, bypassing add_directed().
+
+        The vertex ids are kept, i.e. labels becomes the interner's id -> label list.
+        The incoming edges (in_offsets, in_sources) are derived from the outgoing ones if not given,
+        and skipped altogether if not incoming.
+        '''
+
+        n = len(labels)
+        if not incoming:
+            in_offsets, in_sources = array('q', [0]) * (n + 1), array('i')
+        elif not directed:
+            in_offsets, in_sources = offsets, targets
+        elif in_offsets is None:
+            targets_in, in_sources = edge_list.transpose(n, edge_list.row_ids(offsets), targets)
+            in_offsets = edge_list.row_offsets(n, targets_in)
+
+        Adj = cls(directed, weights is not None, incoming)
+        Adj.V = set(labels)
+        Adj.E = len(targets)
+        Adj._interner = VertexInterner(list(labels))
+
+        # translate the whole columns to labels at once, then slice them per row
+        targets = list(map(labels.__getitem__, targets))
+        in_sources = list(map(labels.__getitem__, in_sources))
+        if weights is not None:
+            weights = weights.tolist()
+
+        for i, u in enumerate(labels):
+            start, stop = offsets[i], offsets[i + 1]
+            if start < stop:
+                row = targets[start : stop]
+                Adj.fromto[u] = set(row)
+                if weights is not None:
+                    Adj.W[u] = dict(zip(row, weights[start : stop]))
+
+            start, stop = in_offsets[i], in_offsets[i + 1]
+            if start < stop:
+                Adj.tofrom[u] = set(in_sources[start : stop])
+
+        return Adj
+
+    def save(self, path, compress : bool = False):
+        '''Save the graph to a snapshot file, see graph_file.write_snapshot()
+
+        The vertex table and the sorted edge columns are taken from the CSR snapshot.
+        The labels must be all ints or all strs, and the weights all numbers, ints are saved as ints.
+        '''
+        G = self.csr()
+        graph_file.write_snapshot(path, G.labels, G.offsets, G.targets, G.weights, self.directed, compress,
+                                  G.in_offsets, G.in_sources)
+
+    @classmethod
+    def load(cls, path):
+        'Load a graph from a snapshot file written by save(), via from_csr()'
+        data = graph_file.read_snapshot(path)
+        return cls.from_csr(data['labels'], data['offsets'], data['targets'], data['weights'], data['directed'],
+                            data['in_offsets'], data['in_sources'])
 
     def add_directed(self, u : any, v : any, w = None):
         'Add a directed edge from u to v to the graph.'
+        self.changing()
         if u not in self.fromto:
             self.fromto[u] = set()
         
@@ -57,24 +357,33 @@ class AdjacencySet:
             self.fromto[u].add(v)
             self.E += 1
         
-        if v not in self.tofrom:
-            self.tofrom[v] = set()
-        
-        if u not in self.tofrom[v]:
-            self.tofrom[v].add(u)
+        if self.incoming:
+            if v not in self.tofrom:
+                self.tofrom[v] = set()
+            
+            if u not in self.tofrom[v]:
+                self.tofrom[v].add(u)
         
         if u not in self.V:
             self.V.add(u)
+            self._interner.intern(u)
 
         if v not in self.V:
             self.V.add(v)
+            self._interner.intern(v)
 
         if self.weighted:
             if u not in self.W:
                 self.W[u] = {}
             
             self.W[u][v] = w
-        
+
+        self.modified()
+
+        if self._components is not None:
+            interner = self.interner
+            self._components.grow(len(interner))
+            self._components.union(interner.id(u), interner.id(v))
 
     def add(self, u : any, v : any, w = None):
         'Add an edge u->v i.e. u-v to the graph'
@@ -82,10 +391,177 @@ class AdjacencySet:
         if not self.directed:
             self.add_directed(v, u, w)
 
+    def changing(self):
+        'Let the cached snapshot read its lazily read weights, before the graph changes under it'
+        if self._csr is not None:
+            self._csr.detach()
+
+    def modified(self):
+        'Mark the graph as modified: bump the version and drop the cached snapshot (and components, unless tracked)'
+        self.version += 1
+        self._csr = None
+        if not self.track_components:
+            self._components = None
+
+    def remove_directed(self, u : any, v : any):
+        '''Remove the directed edge from u to v from the graph in O(1).
+
+        Raises
+        ------
+        KeyError
+            If there is no edge from u to v.
+        '''
+        if v not in self.neighbors(u):
+            raise KeyError('There is no edge ' + str(u) + ' -> ' + str(v))
+
+        self.changing()
+        self.fromto[u].remove(v)
+        if len(self.fromto[u]) == 0:
+            self.fromto.pop(u)
+
+        if self.incoming:
+            self.tofrom[v].remove(u)
+            if len(self.tofrom[v]) == 0:
+                self.tofrom.pop(v)
+
+        if self.weighted:
+            self.W[u].pop(v)
+            if len(self.W[u]) == 0:
+                self.W.pop(u)
+
+        self.E -= 1
+        self.modified()
+        # union-find can't split the components, so they are rebuilt when needed
+        self._components = None
+
+    def remove_edge(self, u : any, v : any):
+        'Remove the edge u->v i.e. u-v from the graph'
+        self.remove_directed(u, v)
+        if not self.directed and u != v:
+            self.remove_directed(v, u)
+
+    def remove_vertex(self, u : any):
+        '''Remove the vertex u and all of its edges from the graph in O(degree(u)),
+        or in O(V + E) if the incoming edges aren't kept.
+
+        Raises
+        ------
+        KeyError
+            If u is not in the graph.
+        '''
+        if u not in self.V:
+            raise KeyError('There is no vertex ' + str(u))
+
+        outgoing, incoming = list(self.neighbors(u)), list(self.neighbors_incoming(u))
+        for v in outgoing:
+            self.remove_directed(u, v)
+        for v in incoming:
+            if v != u:
+            # the self-loop is already removed
+                self.remove_directed(v, u)
+
+        self.V.remove(u)
+        # the ids are re-assigned lazily, the next time the interner is needed
+        self._interner_stale = True
+        self.modified()
+        self._components = None
+
+    def update_weight(self, u : any, v : any, w):
+        '''Change the weight of the edge u->v i.e. u-v.
+
+        Raises
+        ------
+        KeyError
+            If there is no edge from u to v.
+        Exception
+            If the graph isn't weighted.
+        '''
+        if not self.weighted:
+            raise Exception('The graph is not weighted')
+        if v not in self.neighbors(u):
+            raise KeyError('There is no edge ' + str(u) + ' -> ' + str(v))
+
+        self.changing()
+        self.W[u][v] = w
+        if not self.directed:
+            self.W[v][u] = w
+        self.modified()
+
+    CHANGES = ('add', 'remove_edge', 'remove_vertex', 'update_weight')
+
+    def apply_changes(self, delta):
+        '''Apply a batch of changes to the graph.
+
+        Parameters
+        ----------
+        delta : iterable
+            Tuples (operation, *arguments), where the operation is one of CHANGES, e.g.
+                ('add', u, v, w)
+                ('remove_edge', u, v)
+                ('remove_vertex', u)
+                ('update_weight', u, v, w)
+            The changes are applied in order.
+
+        Raises
+        ------
+        ValueError
+            If an operation isn't one of CHANGES. The changes before it remain applied.
+        '''
+        for change in delta:
+            if change[0] not in self.CHANGES:
+                raise ValueError('Unknown change: ' + str(change[0]))
+            getattr(self, change[0])(*change[1:])
+
+    @property
+    def interner(self) -> VertexInterner:
+        'The label <-> dense int id mapping of the vertices'
+        if self._interner_stale:
+        # re-assign the ids of the remaining vertices, keeping their order
+            self._interner = VertexInterner([u for u in self._interner.labels if u in self.V])
+            self._interner_stale = False
+        return self._interner
+
+    @property
+    def components(self) -> UnionFind:
+        ''' The connected components (weakly connected for directed graphs) over the interner's ids.
+
+        If tracked, add() keeps them up to date in near O(1) per edge,
+        otherwise (and after removals) they are rebuilt from the CSR snapshot when needed.
+        '''
+        if self._components is None:
+            self._components = UnionFind.from_graph(self)
+        return self._components
+
+    def same_component(self, u : any, v : any) -> bool:
+        'Return True if u and v are connected, ignoring the directions of the edges'
+        interner = self.interner
+        return self.components.same(interner.id(u), interner.id(v))
+
+    def component_count(self) -> int:
+        'Return the number of connected components, ignoring the directions of the edges'
+        return self.components.count
+
     def vertices(self):
         'Return the list of vertices in the graph'
         return self.V
 
+    def csr(self) -> CSRGraph:
+        ''' Return a CSRGraph snapshot of the graph, for the algorithms that run on int ids.
+
+        The snapshot's ids are the ids from self.interner.
+        It is cached until the graph is modified, i.e. until self.version changes.
+        '''
+        if self._csr is None:
+            self._csr = CSRGraph.from_adjacency_set(self)
+        return self._csr
+
+    def transpose(self) -> CSRGraph:
+        ''' Return the graph with all the edges reversed, as the transpose of the CSR snapshot.
+
+        It is built on first use and cached along with the snapshot, see CSRGraph.transpose().
+        '''
+        return self.csr().transpose()
+
     def neighbors(self, u : any):
         'Return the set of neighbors of u'
         if u in self.fromto:
@@ -94,7 +570,13 @@ class AdjacencySet:
             return set()
 
     def neighbors_incoming(self, u : any):
-        'Return the set of vertices who\'s neighbor is u'
+        '''Return the set of vertices who\'s neighbor is u
+
+        If the incoming edges aren't kept, they are taken from transpose(),
+        which is rebuilt after every modification of the graph.
+        '''
+        if not self.incoming:
+            return set(self.transpose().neighbors(u))
         if u in self.tofrom:
             return self.tofrom[u]
         else:
@@ -106,8 +588,16 @@ class AdjacencySet:
                  
     def vertices_incoming(self):
         'Return the set vertices with incoming edges'
+        if not self.incoming:
+            return self.transpose().vertices_outgoing()
         return set(self.tofrom.keys())
 
+    def __getstate__(self):
+        'Pickle without the cached snapshot'
+        state = self.__dict__.copy()
+        state['_csr'] = None
+        return state
+
     def __str__(self):
         s = "Edges are:\n"
         for u in self.fromto:
@@ -130,6 +620,12 @@ class AdjacencySet:
 # Adj.add(5, 3)
 # print(Adj)
 
+# Adj = CompactAdjacencyList(n, False)
+# Adj.add(1, 2)
+# Adj.add(3, 7)
+# print(Adj)
+# print(list(Adj.neighbors(1)))
+
 # Adj = AdjacencySet(weighted=True)
 # Adj.add(1, 2, 42)
 # Adj.add(2, 1, 21)
@@ -139,4 +635,15 @@ class AdjacencySet:
 # print(Adj.V)
 # print(len(Adj))
 
+# Adj.remove_edge(1, 2)
+# Adj.update_weight(3, 7, 11)
+# Adj.apply_changes([('add', 7, 5, 1), ('remove_vertex', 3)])
+# print(Adj)
+# print(Adj.version)
+
+# Adj = AdjacencySet(directed=False, track_components=True)
+# Adj.add(1, 2)
+# Adj.add(3, 4)
+# print(Adj.same_component(1, 2), Adj.same_component(2, 3), Adj.component_count())
+
 # print("Exiting...")
\ No newline at end of file
@@ -0,0 +1,142 @@
+"""
+    The module implements opt-in instrumentation of the graph algorithms.
+
+    While collecting, the algorithms (BFS, DFS, Dijkstra, Bellman-Ford and the Fibonacci heap) record into a Stats:
+        counters    - e.g. the vertices popped, the edges scanned, the relaxations, the heap operations
+        series      - per level values, e.g. the level sizes, i.e. the frontier sizes of BFS
+        timings     - the seconds spent in each algorithm
+    The names are prefixed by the algorithm, e.g. 'BFS.edges_scanned' or 'heap.decrease_key'.
+    The runs of the same algorithm add up: the counters and the timings are summed,
+    and so are the series, level by level.
+
+    When not collecting, the algorithms only check active() once per call, and the hot loops count nothing:
+    most of the counters are derived after the run from the algorithms' result arrays,
+    and the rest are counted only when collecting, by counting variants chosen once per call,
+    e.g. fibonacci_heap.CountingFibonacciHeap, or a Counted queue push.
+
+    Usage:
+        with instrumentation.collect() as stats:
+            BFS(s, Adj)
+            Dijkstra.dijkstra(Adj, s)
+        print(stats.as_dict())
+"""
+
+from collections import Counter
+from contextlib import contextmanager
+
+current = None  # the Stats being collected into, None when disabled
+
+
+class Stats:
+    'Implements a collection of counters, series and timings.'
+
+    def __init__(self):
+        self.counters = {}
+        self.series = {}
+        self.timings = {}
+
+    def count(self, name : str, k : int = 1):
+        'Add k to the counter name'
+        self.counters[name] = self.counters.get(name, 0) + k
+
+    def time(self, name : str, seconds : float):
+        'Add the seconds to the timing name'
+        self.timings[name] = self.timings.get(name, 0.0) + seconds
+
+    def add_series(self, name : str, values : list):
+        'Add the values to the series name element-wise, extending it if the values are longer'
+        series = self.series.setdefault(name, [])
+        for i, x in enumerate(values):
+            if i < len(series):
+                series[i] += x
+            else:
+                series.append(x)
+
+    def traversal(self, name : str, levels, edges_scanned : int, seconds : float):
+        ''' Record a traversal from its result.
+
+        Parameters
+        ----------
+        name : str
+            The name of the algorithm.
+        levels : iterable
+            The levels of the visited vertices, counted per level and added to the series name.level_sizes.
+        edges_scanned : int
+            The number of edges scanned, i.e. the sum of the degrees of the visited vertices.
+        seconds : float
+            The time taken.
+        '''
+        sizes = Counter(levels)
+        self.count(name + '.vertices_popped', sum(sizes.values()))
+        self.count(name + '.edges_scanned', edges_scanned)
+        self.add_series(name + '.level_sizes', [sizes[lvl] for lvl in range(len(sizes))])
+        self.time(name, seconds)
+
+    def as_dict(self) -> dict:
+        'Return the stats as plain dicts, e.g. for json.dump()'
+        return {'counters' : dict(self.counters), 'series' : dict(self.series), 'timings' : dict(self.timings)}
+
+    def __str__(self):
+        s = ''
+        for name, value in sorted(self.counters.items()):
+            s += name + ' = ' + str(value) + '\n'
+        for name, values in sorted(self.series.items()):
+            s += name + ' = ' + str(values) + '\n'
+        for name, seconds in sorted(self.timings.items()):
+            s += name + ' = ' + '%.6f' % seconds + ' s\n'
+        return s
+
+
+class Counted:
+    'Wraps a function, counting its calls in calls'
+
+    def __init__(self, f):
+        self.f = f
+        self.calls = 0
+
+    def __call__(self, *args):
+        self.calls += 1
+        return self.f(*args)
+
+
+def active() -> Stats:
+    'Return the Stats being collected into, or None if the instrumentation is disabled'
+    return current
+
+
+def enable() -> Stats:
+    'Start collecting into a new Stats, and return it'
+    global current
+    current = Stats()
+    return current
+
+
+def disable():
+    'Stop collecting'
+    global current
+    current = None
+
+
+@contextmanager
+def collect():
+    'Collect into a new Stats within the with block, restoring the previous state after it'
+    global current
+    previous = current
+    current = Stats()
+    try:
+        yield current
+    finally:
+        current = previous
+
+
+# from BFS import BFS
+# from dijkstra import Dijkstra
+# from graph_generators import erdos_renyi
+
+# Adj = erdos_renyi(1000, 5000, weights=(1, 10), seed=1)
+# with collect() as stats:
+#     BFS(0, Adj)
+#     Dijkstra.dijkstra(Adj, 0)
+# print(stats)
+
+# print("Exiting...")
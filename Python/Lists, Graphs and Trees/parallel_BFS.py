@@ -0,0 +1,165 @@
+"""
+    The module implements a level-synchronous BFS, akin to BFS.BFS_list, parallelized across a process pool.
+
+    The workers share the graph read-only: each one opens the same graph file via graph_file.open_graph(),
+    so they all map the same pages of the OS's page cache, instead of each holding a copy of the graph.
+    The levels and the parents live in shared memory (multiprocessing.RawArray), and are written without any locks or atomics,
+    as each vertex is owned by exactly one of P partitions (owner-computes, v is owned by v % P),
+    and only the task of the owner writes the vertex's entries.
+
+    Each level takes two parallel phases:
+        expand  - the frontier is split into P chunks, and each task scans the edges of its chunk,
+                  keeping the unvisited neighbors, bucketed by their owners
+        claim   - each task gets the buckets of one owner, and claims its still unvisited vertices,
+                  i.e. sets their level and parent, and returns them as its part of the next frontier
+    Small frontiers are processed in this process, as they aren't worth the round trips to the pool.
+"""
+
+import multiprocessing
+import os
+import tempfile
+from array import array
+
+import graph_file
+from vertex_interning import DenseMap
+
+# the per-process state of the pool's workers, set by init_worker()
+state = {}
+
+
+def init_worker(path, level, parent, P : int):
+    'Open the shared graph file and keep the shared level and parent arrays'
+    state['G'] = graph_file.open_graph(path)
+    state['level'] = level
+    state['parent'] = parent
+    state['P'] = P
+
+
+def expand(frontier : array) -> list:
+    'Scan the edges of the frontier vertices, returns the (vertices, parents) buckets of the unvisited ones per owner'
+    G, level, P = state['G'], state['level'], state['P']
+    buckets = [(array('i'), array('i')) for _ in range(P)]
+    for u in frontier:
+        for v in G.neighbor_ids(u):
+            if level[v] < 0:
+            # the level may be set concurrently, so claim() checks it again
+                vs, us = buckets[v % P]
+                vs.append(v)
+                us.append(u)
+    return buckets
+
+
+def claim(buckets : list, next_level : int) -> array:
+    'Set the level and the parent of the unvisited vertices of one owner, returns them as the owner\'s next frontier'
+    level, parent = state['level'], state['parent']
+    next = array('i')
+    for vs, us in buckets:
+        for v, u in zip(vs, us):
+            if level[v] < 0:
+                level[v] = next_level
+                parent[v] = u
+                next.append(v)
+    return next
+
+
+def parallel_BFS(s, Adj, processes : int = None, path = None, sequential_cutoff : int = 1024) -> (DenseMap, DenseMap):
+    ''' Level-synchronous BFS across a process pool.
+
+    Parameters
+    ----------
+    s : any
+        The starting vertex.
+    Adj : AdjacencySet / CSRGraph
+        The graph, its labels must be all ints or all strs (see graph_file.write_graph()).
+    processes : int
+        The number of worker processes, os.cpu_count() by default.
+    path : str / path
+        A graph file of Adj written by graph_file.write_graph(), to be shared by the workers.
+        If None, the graph is written to a temporary file.
+    sequential_cutoff : int
+        The frontiers smaller than this are processed in this process.
+
+    Returns
+    -------
+    (parent : DenseMap, level : DenseMap)
+        The levels are identical to BFS_list's, a parent may be any vertex of the previous level.
+    '''
+    P = processes or os.cpu_count() or 1
+    temporary = None
+    if path is None:
+        fd, temporary = tempfile.mkstemp(suffix='.csrg')
+        os.close(fd)
+        graph_file.write_graph(Adj, temporary)
+        path = temporary
+
+    G = graph_file.open_graph(path)
+    n = len(G)
+    if s not in G.index:
+        if temporary is not None:
+            os.remove(temporary)
+        return {s : None}, {s : 0}
+
+    level = multiprocessing.RawArray('i', n)
+    parent = multiprocessing.RawArray('i', n)
+    level[:] = array('i', [-1]) * n
+    parent[:] = array('i', [DenseMap.MISSING]) * n
+    pool = None
+    try:
+        init_worker(path, level, parent, P)
+
+        i = G.index[s]
+        level[i] = 0
+        parent[i] = DenseMap.NONE
+        frontier = array('i', [i])
+        lvl = 0
+        while len(frontier) > 0:
+            if len(frontier) < sequential_cutoff or P == 1:
+                buckets = expand(frontier)
+                next_parts = [claim([bucket], lvl + 1) for bucket in buckets]
+            else:
+                if pool is None:
+                    pool = multiprocessing.Pool(P, init_worker, (path, level, parent, P))
+                chunks = [frontier[k::P] for k in range(P)]
+                buckets = pool.map(expand, chunks)
+                # the buckets of each owner, from all the expanding tasks
+                owned = [[task_buckets[p] for task_buckets in buckets] for p in range(P)]
+                next_parts = pool.starmap(claim, [(owned[p], lvl + 1) for p in range(P)])
+
+            frontier = array('i')
+            for part in next_parts:
+                frontier.extend(part)
+            lvl += 1
+
+    finally:
+        if pool is not None:
+            pool.close()
+            pool.join()
+        state.clear()
+        if temporary is not None:
+        # the graph stays mapped, so the file can be removed
+            os.remove(temporary)
+
+    level, parent = array('i', bytes(level)), array('i', bytes(parent))
+    return DenseMap(G.interner, parent, DenseMap.MISSING, labelled=True), DenseMap(G.interner, level, -1)
+
+
+# from time import perf_counter
+
+# from BFS import BFS_list
+# from graph_generators import rmat
+
+# if __name__ == '__main__':
+#     Adj = rmat(18, directed=False, seed=1)
+#     graph_file.write_graph(Adj, 'rmat18.csrg')
+#     s = max(Adj.vertices(), key=lambda u: len(Adj.neighbors(u)))
+
+#     start = perf_counter()
+#     parent, level = BFS_list(s, Adj)
+#     print('BFS_list:', '%.3f' % (perf_counter() - start), 's')
+#     for processes in (1, 8, 16, 32):
+#         start = perf_counter()
+#         parent_p, level_p = parallel_BFS(s, Adj, processes, 'rmat18.csrg')
+#         print(processes, 'processes:', '%.3f' % (perf_counter() - start), 's')
+#         assert dict(level_p) == level
+
+# print("Exiting...")
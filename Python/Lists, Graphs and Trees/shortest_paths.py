@@ -48,8 +48,20 @@ To do that, find h[u] such that, for every u,v pair:
 
 """
 
+import importlib
+import multiprocessing
+import os
+import tempfile
+from array import array
 from math import inf
 
+import graph_file
+from dijkstra import Dijkstra
+from graph_csr import CSRGraph
+from vertex_interning import DenseMap
+
+bellman_ford = importlib.import_module('bellman-ford')
+
 
 def floyd_warshall(w: list) -> list:
     """ Floyd-Warshall's is a DP algorithm.
@@ -99,4 +111,152 @@ def floyd_warshall(w: list) -> list:
 
     return d
 
-# TODO implement Johnson's algorithm
+def reweight(Adj) -> (CSRGraph, array):
+    """ Step 1 of Johnson's algorithm, the nonnegative reweighting.
+
+    The virtual source is appended to a copy of the graph's CSR arrays as the id n,
+    with 0-weight edges to all the other vertices, and Bellman-Ford from it gives the potentials h.
+    The reweighted edges are (w[u][v] + h[u]) - h[v], computed in the same order as Bellman-Ford's relaxations,
+    so they come out exactly nonnegative in floating point once it has converged.
+
+    Returns
+    -------
+    (G_h : CSRGraph, h : array)
+        The reweighted graph on the same labels and ids, and the potentials.
+    None
+        If there is a negative weight cycle, i.e. some reweighted edge is still negative.
+    """
+
+    G = Adj.csr()
+    n = len(G)
+    offsets, targets, weights = G.offsets, G.targets, G.weights
+
+    source = object()   # the virtual source, equal to no label
+    virtual = CSRGraph(list(G.labels) + [source],
+                       array('q', offsets) + array('q', [G.E + n]),
+                       array('i', targets) + array('i', range(n)),
+                       array('d', weights) + array('d', [0]) * n)
+    h = bellman_ford.bellman_ford_sssp(virtual, source).data[:n]
+
+    reweighted = array('d', weights)
+    for u in range(n):
+        for k in range(offsets[u], offsets[u + 1]):
+            reweighted[k] = (weights[k] + h[u]) - h[targets[k]]
+            if reweighted[k] < 0:
+                return None
+
+    return CSRGraph(G.labels, offsets, targets, reweighted, True, G.index), h
+
+
+# the per-process state of the pool's workers, set by init_worker()
+state = {}
+
+
+def init_worker(G_h, h : array):
+    'Keep the reweighted graph (or the path of its graph file) and the potentials'
+    state['G'] = graph_file.open_graph(G_h) if not isinstance(G_h, CSRGraph) else G_h
+    state['h'] = h
+
+
+def johnson_row(u : int) -> (int, array):
+    'Steps 2 and 3 of Johnson\'s algorithm for the source id u, returns the row of its distances'
+    G, h = state['G'], state['h']
+    row = array('d', [inf]) * len(h)
+    d_h, _ = Dijkstra.dijkstra_lazy(G, G.labels[u])
+    for v, x in d_h.data.items():
+        row[v] = x - h[u] + h[v]
+    return u, row
+
+
+def johnson(Adj, processes : int = 1):
+    """ Johnson's algorithm for all pairs shortest paths.
+
+    After the reweighting, the V Dijkstra runs are made in this process by default.
+    Given more processes, they are dispatched across a process pool
+    whose workers share the reweighted graph, via a temporary graph file (see graph_file.open_graph()).
+    The rows are yielded one by one as they complete, in the order of the vertices,
+    so the V x V distances are never held in memory at once, see johnson_matrix() for that.
+
+    Parameters
+    ----------
+    Adj : AdjacencySet / CSRGraph
+        The weighted graph, possibly with negative edges.
+    processes : int
+        The number of worker processes, None for os.cpu_count(). 1 (the default) runs in this process,
+        and so do the graphs whose labels aren't all ints or all strs, as they can't be written to a graph file.
+
+    Returns
+    -------
+    iterator of (u, row : DenseMap)
+        The rows of the distances from each vertex u, row[v] is inf if v isn't reachable from u.
+    None
+        If there is a negative weight cycle.
+    """
+
+    reweighted = reweight(Adj)
+    if reweighted is None:
+        print("There is at least one negative weight cycle.")
+        return None
+    return johnson_rows(*reweighted, processes or os.cpu_count() or 1)
+
+
+def johnson_rows(G_h : CSRGraph, h : array, P : int):
+    'Yield the (u, row) pairs of johnson()'
+    n = len(G_h)
+    interner = G_h.interner
+
+    path = None
+    if P > 1:
+        fd, path = tempfile.mkstemp(suffix='.csrg')
+        os.close(fd)
+        try:
+            graph_file.write_graph(G_h, path)
+        except TypeError:
+        # the labels can't be written to a graph file, so the rows are computed in this process
+            os.remove(path)
+            path = None
+
+    if path is None:
+        init_worker(G_h, h)
+        try:
+            for u in range(n):
+                yield G_h.labels[u], DenseMap(interner, johnson_row(u)[1])
+        finally:
+            state.clear()
+        return
+
+    try:
+        with multiprocessing.Pool(P, init_worker, (path, h)) as pool:
+            for u, row in pool.imap(johnson_row, range(n), chunksize=max(1, n // (4 * P))):
+                yield G_h.labels[u], DenseMap(interner, row)
+    finally:
+        os.remove(path)
+
+
+def johnson_matrix(Adj, processes : int = 1) -> list:
+    """ Johnson's algorithm, returning the full distance matrix, d[i][j] for the vertex ids i and j,
+    as floyd_warshall() does, or None if there is a negative weight cycle. """
+
+    rows = johnson(Adj, processes)
+    if rows is None:
+        return None
+    return [list(row.data) for _, row in rows]
+
+
+# from graph_representation import AdjacencySet
+
+# if __name__ == '__main__':
+#     Adj = AdjacencySet(directed=True, weighted=True)
+#     Adj.add_directed(0, 1, 3)
+#     Adj.add_directed(0, 2, 8)
+#     Adj.add_directed(1, 3, 1)
+#     Adj.add_directed(2, 1, 4)
+#     Adj.add_directed(3, 0, 2)
+#     Adj.add_directed(3, 2, -5)
+
+#     for u, row in johnson(Adj):
+#         print(u, row)
+#     print(johnson_matrix(Adj))
+
+#     w = [[0 if i == j else Adj.W[i].get(j, inf) for j in range(4)] for i in range(4)]
+#     print(floyd_warshall(w))
@@ -0,0 +1,99 @@
+"""
+    The module implements the disjoint-set (union-find) data structure over the int ids 0..n-1.
+
+    The sets are kept as a forest in typed arrays: parent[i] is i's parent, and the roots are their own parents.
+        find(i)     - follows the parents to the root, which identifies i's set,
+                      and points every vertex on the way directly to the root (path compression)
+        union(i, j) - hangs the root of the lower rank tree under the other one (union by rank)
+    Together they make both O(alpha(n)), i.e. practically O(1), amortized.
+
+    It tracks the (weakly) connected components of a graph while its edges stream in,
+    see AdjacencySet.same_component().
+"""
+
+from array import array
+
+import edge_list
+
+
+class UnionFind:
+    'Implements a disjoint-set forest with path compression and union by rank.'
+
+    def __init__(self, n : int = 0):
+        self.parent = array('i', range(n))
+        self.rank = bytearray(n)    # the ranks are at most log2(n)
+        self.count = n              # the number of sets
+
+    @classmethod
+    def from_graph(cls, Adj):
+        'Return the connected components (weakly connected for directed graphs) of the graph, over its ids'
+        G = Adj.csr()
+        uf = cls(len(G))
+        uf.union_edges(edge_list.row_ids(G.offsets), G.targets)
+        return uf
+
+    def add(self) -> int:
+        'Add a new singleton set, returns its id'
+        i = len(self.parent)
+        self.parent.append(i)
+        self.rank.append(0)
+        self.count += 1
+        return i
+
+    def grow(self, n : int):
+        'Add singleton sets up to the id n-1'
+        while len(self.parent) < n:
+            self.add()
+
+    def find(self, i : int) -> int:
+        'Return the root of i\'s set, compressing the path to it'
+        parent = self.parent
+        root = i
+        while parent[root] != root:
+            root = parent[root]
+        while parent[i] != root:
+            parent[i], i = root, parent[i]
+        return root
+
+    def union(self, i : int, j : int) -> bool:
+        'Merge the sets of i and j, returns False if they were the same set already'
+        i, j = self.find(i), self.find(j)
+        if i == j:
+            return False
+        rank = self.rank
+        if rank[i] < rank[j]:
+            i, j = j, i
+        self.parent[j] = i
+        if rank[i] == rank[j]:
+            rank[i] += 1
+        self.count -= 1
+        return True
+
+    def union_edges(self, us, vs) -> int:
+        'Merge the sets of the endpoints of all the edges in the columns us and vs, returns the number of merges'
+        merges = 0
+        union = self.union
+        for u, v in zip(us, vs):
+            if union(u, v):
+                merges += 1
+        return merges
+
+    def same(self, i : int, j : int) -> bool:
+        'Return True if i and j are in the same set'
+        return self.find(i) == self.find(j)
+
+    def components(self) -> array:
+        'Return the array of component ids 0..count-1 of all the ids, numbered in the order of their first members'
+        ids = {}
+        return array('i', (ids.setdefault(self.find(i), len(ids)) for i in range(len(self.parent))))
+
+    def __len__(self):
+        return len(self.parent)
+
+
+# uf = UnionFind(6)
+# uf.union_edges([0, 1, 3], [1, 2, 4])
+# print(uf.count, uf.same(0, 2), uf.same(2, 3))
+# print(list(uf.components()))
+
+# print("Exiting...")
@@ -0,0 +1,169 @@
+"""
+    The module implements the interning of vertex labels to dense int ids.
+
+    The graph classes accept any hashable vertex label (the demos use strings like 'A'),
+    but hashing and comparing labels in the hot loops of graph algorithms is costly.
+    So the labels are interned to ids 0..n-1, the algorithms run on the ids,
+    keeping their results in dense arrays indexed by the ids,
+    and only translate between the labels and the ids at the API boundary:
+        VertexInterner  - the bidirectional label <-> id mapping
+        DenseMap        - a read-only dict-like view of a dense array, keyed by the labels,
+                          which translates the labels lazily, i.e. only on access
+        SparseMap       - the same view of a dict keyed by the ids, for results that reach only a part of the graph
+"""
+
+from collections.abc import Mapping
+
+
+class VertexInterner:
+    'Implements a bidirectional mapping between vertex labels and dense int ids.'
+
+    def __init__(self, labels : list = None, index = None):
+        if labels is None:
+            labels = []
+        if index is None:
+            index = {u : i for i, u in enumerate(labels)}
+        self.labels = labels    # id -> label
+        self.index = index      # label -> id
+
+    def intern(self, u : any) -> int:
+        'Return the id of the label u, assigning it the next free id if u is new'
+        i = self.index.get(u)
+        if i is None:
+            i = len(self.labels)
+            self.index[u] = i
+            self.labels.append(u)
+        return i
+
+    def id(self, u : any) -> int:
+        'Return the id of the label u, raises KeyError if u isn\'t interned'
+        return self.index[u]
+
+    def label(self, i : int) -> any:
+        'Return the label with the id i'
+        return self.labels[i]
+
+    def __contains__(self, u : any):
+        return u in self.index
+
+    def __iter__(self):
+        return iter(self.labels)
+
+    def __len__(self):
+        return len(self.labels)
+
+
+class DenseMap(Mapping):
+    ''' Read-only dict-like view of a dense array of per-vertex values, keyed by the vertex labels.
+
+    Parameters
+    ----------
+    interner : VertexInterner
+        Translates between the labels and the ids, i.e. the indices of the array.
+    values : array / list
+        The values, values[i] holds the value of the vertex with the id i, kept as the data attribute.
+    missing : any
+        values[i] == missing marks that the vertex i has no entry, e.g. it wasn't reached.
+        If None, every vertex has an entry.
+    labelled : bool
+        If True, the values are ids themselves (e.g. parents), and are translated to labels on access.
+        The value -1 is translated to None, e.g. the parent of the source.
+    '''
+
+    NONE = -1       # labelled value that stands for None
+    MISSING = -2    # the usual missing marker for labelled values
+
+    def __init__(self, interner : VertexInterner, values, missing = None, labelled : bool = False):
+        self.interner = interner
+        self.data = values
+        self.missing = missing
+        self.labelled = labelled
+
+    def by_id(self, i : int):
+        'Return the (untranslated) value of the vertex with the id i'
+        return self.data[i]
+
+    def __getitem__(self, u):
+        x = self.data[self.interner.id(u)]
+        if self.missing is not None and x == self.missing:
+            raise KeyError(u)
+        if self.labelled:
+            return None if x == self.NONE else self.interner.label(x)
+        return x
+
+    def __iter__(self):
+        label = self.interner.label
+        if self.missing is None:
+            for i in range(len(self.data)):
+                yield label(i)
+        else:
+            missing = self.missing
+            for i, x in enumerate(self.data):
+                if x != missing:
+                    yield label(i)
+
+    def __len__(self):
+        if self.missing is None:
+            return len(self.data)
+        return len(self.data) - self.data.count(self.missing)
+
+    def __repr__(self):
+        return repr(dict(self.items()))
+
+
+class SparseMap(Mapping):
+    ''' Read-only dict-like view of a dict of per-vertex values keyed by the ids, keyed by the vertex labels.
+
+    Unlike a DenseMap it takes no O(V) array, so the results of searches that reach only a small part of a graph
+    stay proportional to the part reached.
+
+    Parameters
+    ----------
+    interner : VertexInterner
+        Translates between the labels and the ids, i.e. the keys of the dict.
+    values : dict
+        The values, values[i] holds the value of the vertex with the id i, kept as the data attribute.
+    default : any
+        The value of the vertices without an entry, e.g. float('Inf') for distances.
+        If None, the vertices without an entry are missing, otherwise every vertex has a value.
+    labelled : bool
+        If True, the values are ids themselves (e.g. parents), and are translated to labels on access.
+        The value -1 is translated to None, e.g. the parent of the source.
+    '''
+
+    def __init__(self, interner : VertexInterner, values : dict, default = None, labelled : bool = False):
+        self.interner = interner
+        self.data = values
+        self.default = default
+        self.labelled = labelled
+
+    def by_id(self, i : int):
+        'Return the (untranslated) value of the vertex with the id i'
+        return self.data.get(i, self.default)
+
+    def __getitem__(self, u):
+        i = self.interner.id(u)
+        if i not in self.data:
+            if self.default is None:
+                raise KeyError(u)
+            return self.default
+        x = self.data[i]
+        if self.labelled:
+            return None if x == DenseMap.NONE else self.interner.label(x)
+        return x
+
+    def __iter__(self):
+        if self.default is None:
+            label = self.interner.label
+            for i in self.data:
+                yield label(i)
+        else:
+            yield from self.interner
+
+    def __len__(self):
+        if self.default is None:
+            return len(self.data)
+        return len(self.interner)
+
+    def __repr__(self):
+        return repr(dict(self.items()))